@@ -0,0 +1,341 @@
+"""API HTTP/JSON do Livro Caixa para integrações (ex.: PDV) e scripts, sem Streamlit.
+
+Uso:
+    python api.py                          # http://127.0.0.1:8502
+    python api.py --host 0.0.0.0 --porta 8600
+
+Autenticação: POST /sessao com {"username": ..., "senha": ...} devolve um token (o mesmo da
+aplicação web); as demais rotas exigem o cabeçalho "Authorization: Bearer <token>".
+Valores monetários são sempre inteiros em centavos.
+
+    POST   /sessao                    login -> {"token", "permissao"}
+    GET    /contas                    {"contas": {nome: id}}
+    POST   /contas                    {"nome"} -> {"id"}                                  (editor)
+    GET    /lancamentos?periodo=AAAAMM[&apos_data=&apos_id=&tamanho=&inicio=&fim=&texto=&tipo=]
+    POST   /lancamentos               {"lancamentos": [{data, historico, complemento, entrada, saida, conta}]}
+                                      inserção em lote, tudo ou nada -> {"inseridos"}      (editor)
+    PUT    /lancamentos/<id>          {data, historico, complemento, entrada, saida, conta} (editor)
+    DELETE /lancamentos/<id>                                                              (editor)
+    GET    /busca?texto=...[&inicio=AAAA-MM-DD&fim=AAAA-MM-DD]
+    GET    /resumo?ano=AAAA           totais e saldos por mês
+    GET    /resumo/contas?ano=AAAA    totais por mês e conta
+    GET    /exportacao/AAAAMM.csv     CSV do mês
+    GET    /exportacao/AAAA.zip       ZIP do ano
+    GET    /auditoria[?lancamento=<id>&limite=]   diário de alterações (quem, quando, antes/depois)
+    GET    /livro?momento=AAAA-MM-DD HH:MM:SS&periodo=AAAAMM   lançamentos como estavam no momento
+                                      (UTC; com fuso, ex.: 2026-03-01T10:00:00-03:00, é convertido)
+"""
+import argparse
+import io
+import json
+import os
+import re
+import shutil
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import servico
+from escrita import definir_usuario
+from migracoes import garantir_schema
+
+TAMANHO_MAXIMO_CORPO = 16 * 1024 * 1024  # bytes aceitos em um POST/PUT
+TAMANHO_MAXIMO_PAGINA = 1000
+PERMISSOES_ESCRITA = ('admin', 'editor')
+
+
+class ErroApi(Exception):
+    """Erro com o status HTTP da resposta"""
+
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _inteiro_centavos(valor, campo):
+    # bool é subclasse de int e float perderia centavos: só inteiros são aceitos
+    if isinstance(valor, bool) or not isinstance(valor, int):
+        raise ErroApi(HTTPStatus.BAD_REQUEST, f"'{campo}' deve ser um inteiro em centavos")
+    return valor
+
+
+def _data(valor):
+    try:
+        return date.fromisoformat(str(valor)).isoformat()
+    except ValueError:
+        raise ErroApi(HTTPStatus.BAD_REQUEST, f"data inválida: '{valor}' (use AAAA-MM-DD)")
+
+
+def _inteiro(valor, parametro, minimo=0):
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        raise ErroApi(HTTPStatus.BAD_REQUEST, f"parâmetro '{parametro}' deve ser um número inteiro")
+    if numero < minimo:
+        raise ErroApi(HTTPStatus.BAD_REQUEST, f"parâmetro '{parametro}' deve ser maior ou igual a {minimo}")
+    return numero
+
+
+def _periodo(valor):
+    if not re.fullmatch(r'\d{4}(0[1-9]|1[0-2])', str(valor)):
+        raise ErroApi(HTTPStatus.BAD_REQUEST, f"período inválido: '{valor}' (use AAAAMM)")
+    return int(valor)
+
+
+def registro_lancamento(dados):
+    """Converte um lançamento recebido em JSON em (data, historico, complemento, entrada, saida, conta)"""
+    if not isinstance(dados, dict):
+        raise ErroApi(HTTPStatus.BAD_REQUEST, 'cada lançamento deve ser um objeto JSON')
+    return (_data(dados.get('data')),
+            str(dados.get('historico') or '').strip(),
+            str(dados.get('complemento') or '').strip(),
+            _inteiro_centavos(dados.get('entrada', 0), 'entrada'),
+            _inteiro_centavos(dados.get('saida', 0), 'saida'),
+            str(dados.get('conta') or '').strip())
+
+
+class Manipulador(BaseHTTPRequestHandler):
+    """Atende as rotas da API; cada requisição roda em uma thread do servidor"""
+    server_version = 'LivroCaixa/1.0'
+    protocol_version = 'HTTP/1.1'  # conexões persistentes para clientes que enviam vários lotes
+
+    # (método, caminho, nome do método que atende, permissão exigida: None, 'leitura' ou 'escrita')
+    ROTAS = [
+        ('POST', r'/sessao', 'criar_sessao', None),
+        ('GET', r'/contas', 'listar_contas', 'leitura'),
+        ('POST', r'/contas', 'criar_conta', 'escrita'),
+        ('GET', r'/lancamentos', 'listar_lancamentos', 'leitura'),
+        ('POST', r'/lancamentos', 'inserir_lancamentos', 'escrita'),
+        ('PUT', r'/lancamentos/(?P<lancamento_id>\d+)', 'alterar_lancamento', 'escrita'),
+        ('DELETE', r'/lancamentos/(?P<lancamento_id>\d+)', 'excluir_lancamento', 'escrita'),
+        ('GET', r'/busca', 'pesquisar', 'leitura'),
+        ('GET', r'/resumo', 'resumo_mensal', 'leitura'),
+        ('GET', r'/resumo/contas', 'resumo_contas', 'leitura'),
+        ('GET', r'/exportacao/(?P<periodo>\d{6})\.csv', 'exportar_periodo', 'leitura'),
+        ('GET', r'/exportacao/(?P<ano>\d{4})\.zip', 'exportar_ano', 'leitura'),
+        ('GET', r'/auditoria', 'diario', 'leitura'),
+        ('GET', r'/livro', 'livro_no_momento', 'leitura'),
+    ]
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def do_PUT(self):
+        self._atender('PUT')
+
+    def do_DELETE(self):
+        self._atender('DELETE')
+
+    # Infraestrutura
+    def _atender(self, metodo):
+        url = urlsplit(self.path)
+        try:
+            rota = self._rota(metodo, url.path)
+            if rota is None:
+                raise ErroApi(HTTPStatus.NOT_FOUND, 'rota não encontrada')
+            nome, permissao, parametros = rota
+            self.usuario = self._autorizar(permissao)
+            # Autor das escritas desta requisição no diário de auditoria
+            definir_usuario(self.usuario[0] if self.usuario else None)
+            self.consulta = {chave: valores[-1] for chave, valores in parse_qs(url.query).items()}
+            getattr(self, nome)(**parametros)
+        except ErroApi as e:
+            self._erro(str(e), e.status)
+        except ValueError as e:
+            # Validações do serviço (contas, lançamentos inexistentes no lote, momento da auditoria);
+            # os parâmetros da requisição já foram validados pelas rotas
+            self._erro(str(e), HTTPStatus.BAD_REQUEST)
+        except Exception as e:
+            self.log_error('Erro em %s %s: %r', metodo, url.path, e)
+            self._erro('erro interno', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    def _rota(self, metodo, caminho):
+        for metodo_rota, padrao, nome, permissao in self.ROTAS:
+            encontrado = re.fullmatch(padrao, caminho.rstrip('/') or '/')
+            if encontrado and metodo_rota == metodo:
+                return nome, permissao, encontrado.groupdict()
+        return None
+
+    def _autorizar(self, permissao):
+        if permissao is None:
+            return None
+        cabecalho = self.headers.get('Authorization', '')
+        if not cabecalho.startswith('Bearer '):
+            raise ErroApi(HTTPStatus.UNAUTHORIZED, 'token de sessão ausente')
+        usuario = servico.usuario_da_sessao(cabecalho[len('Bearer '):].strip())
+        if usuario is None:
+            raise ErroApi(HTTPStatus.UNAUTHORIZED, 'token de sessão inválido ou expirado')
+        if permissao == 'escrita' and usuario[1] not in PERMISSOES_ESCRITA:
+            raise ErroApi(HTTPStatus.FORBIDDEN, 'usuário sem permissão de edição')
+        return usuario
+
+    def _corpo(self):
+        tamanho = _inteiro(self.headers.get('Content-Length') or 0, 'Content-Length')
+        if tamanho > TAMANHO_MAXIMO_CORPO:
+            raise ErroApi(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'corpo da requisição muito grande')
+        try:
+            dados = json.loads(self.rfile.read(tamanho) or b'{}')
+        except ValueError:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, 'JSON inválido')
+        if not isinstance(dados, dict):
+            raise ErroApi(HTTPStatus.BAD_REQUEST, 'o corpo deve ser um objeto JSON')
+        return dados
+
+    def _json(self, dados, status=HTTPStatus.OK):
+        corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _erro(self, mensagem, status):
+        # O corpo da requisição pode não ter sido lido: a conexão não é reaproveitada
+        self.close_connection = True
+        self._json({'erro': mensagem}, status)
+
+    def _arquivo(self, arquivo, tamanho, tipo, nome):
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(tamanho))
+        self.send_header('Content-Disposition', f'attachment; filename="{nome}"')
+        self.end_headers()
+        shutil.copyfileobj(arquivo, self.wfile)
+
+    def _opcional(self, parametro, conversao, *args):
+        """Parâmetro da consulta convertido (e validado), ou None quando ausente"""
+        if parametro not in self.consulta:
+            return None
+        return conversao(self.consulta[parametro], *args)
+
+    def _conta_id(self, conta):
+        if not conta:
+            return None
+        contas = servico.listar_contas()
+        if conta not in contas:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, f"conta '{conta}' não cadastrada")
+        return contas[conta]
+
+    # Rotas
+    def criar_sessao(self):
+        dados = self._corpo()
+        username = str(dados.get('username') or '')
+        autenticado = servico.autenticar(username, str(dados.get('senha') or ''))
+        if not autenticado:
+            raise ErroApi(HTTPStatus.UNAUTHORIZED, 'usuário ou senha inválidos')
+        permissao, password_hash = autenticado
+        self._json({'token': servico.emitir_token(username, password_hash), 'permissao': permissao})
+
+    def listar_contas(self):
+        self._json({'contas': servico.listar_contas()})
+
+    def criar_conta(self):
+        self._json({'id': servico.adicionar_conta(self._corpo().get('nome'))}, HTTPStatus.CREATED)
+
+    def listar_lancamentos(self):
+        if 'periodo' not in self.consulta:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, "parâmetro 'periodo' (AAAAMM) obrigatório")
+        periodo = _periodo(self.consulta['periodo'])
+        tipo = self.consulta.get('tipo')
+        if tipo not in (None, 'entrada', 'saida'):
+            raise ErroApi(HTTPStatus.BAD_REQUEST, "parâmetro 'tipo' deve ser 'entrada' ou 'saida'")
+        filtros = {
+            'data_inicio': self._opcional('inicio', _data),
+            'data_fim': self._opcional('fim', _data),
+            'texto': self.consulta.get('texto'),
+            'valor_minimo': self._opcional('valor_minimo', _inteiro, 'valor_minimo'),
+            'valor_maximo': self._opcional('valor_maximo', _inteiro, 'valor_maximo'),
+            'tipo': tipo,
+        }
+        apos = None
+        if 'apos_data' in self.consulta:
+            apos = (_data(self.consulta['apos_data']), _inteiro(self.consulta.get('apos_id', 0), 'apos_id'))
+        tamanho = min(_inteiro(self.consulta.get('tamanho', 50), 'tamanho', 1), TAMANHO_MAXIMO_PAGINA)
+
+        linhas, tem_proxima, (quantidade, entradas, saidas) = servico.pagina_lancamentos(
+            periodo, filtros, apos, tamanho)
+        self._json({
+            'lancamentos': linhas,
+            # Cursor da próxima página: repassar como apos_data/apos_id
+            'proxima': {'apos_data': linhas[-1]['data'], 'apos_id': linhas[-1]['id']} if tem_proxima else None,
+            'totais': {'quantidade': quantidade, 'entradas': entradas, 'saidas': saidas},
+        })
+
+    def inserir_lancamentos(self):
+        lancamentos = self._corpo().get('lancamentos')
+        if not isinstance(lancamentos, list) or not lancamentos:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, "'lancamentos' deve ser uma lista não vazia")
+        registros = [registro_lancamento(dados) for dados in lancamentos]
+        self._json({'inseridos': servico.importar_lancamentos(registros)}, HTTPStatus.CREATED)
+
+    def alterar_lancamento(self, lancamento_id):
+        data, historico, complemento, entrada, saida, conta = registro_lancamento(self._corpo())
+        if not servico.editar_lancamento(int(lancamento_id), data, historico, complemento, entrada, saida,
+                                         self._conta_id(conta)):
+            raise ErroApi(HTTPStatus.NOT_FOUND, 'lançamento não encontrado')
+        self._json({'id': int(lancamento_id)})
+
+    def excluir_lancamento(self, lancamento_id):
+        if not servico.excluir_lancamento(int(lancamento_id)):
+            raise ErroApi(HTTPStatus.NOT_FOUND, 'lançamento não encontrado')
+        self._json({'id': int(lancamento_id)})
+
+    def pesquisar(self):
+        texto = self.consulta.get('texto', '').strip()
+        if not texto:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, "parâmetro 'texto' obrigatório")
+        self._json({'lancamentos': servico.pesquisar(texto, self._opcional('inicio', _data),
+                                                     self._opcional('fim', _data))})
+
+    def resumo_mensal(self):
+        self._json({'meses': servico.resumo_mensal(_inteiro(self.consulta.get('ano', date.today().year), 'ano', 1))})
+
+    def resumo_contas(self):
+        self._json({'contas': servico.resumo_contas(_inteiro(self.consulta.get('ano', date.today().year), 'ano', 1))})
+
+    def exportar_periodo(self, periodo):
+        conteudo = servico.exportar_periodo(_periodo(periodo))
+        self._arquivo(io.BytesIO(conteudo), len(conteudo), 'text/csv; charset=utf-8', f'livro_caixa_{periodo}.csv')
+
+    def exportar_ano(self, ano):
+        with servico.exportar_ano(int(ano)) as arquivo:
+            arquivo.seek(0, os.SEEK_END)
+            tamanho = arquivo.tell()
+            arquivo.seek(0)
+            self._arquivo(arquivo, tamanho, 'application/zip', f'livro_caixa_{ano}.zip')
+
+    def diario(self):
+        lancamento_id = self._opcional('lancamento', _inteiro, 'lancamento', 1)
+        limite = min(_inteiro(self.consulta.get('limite', 200), 'limite', 1), TAMANHO_MAXIMO_PAGINA)
+        self._json({'alteracoes': servico.diario(lancamento_id, limite)})
+
+    def livro_no_momento(self):
+        if 'momento' not in self.consulta or 'periodo' not in self.consulta:
+            raise ErroApi(HTTPStatus.BAD_REQUEST, "parâmetros 'momento' e 'periodo' (AAAAMM) obrigatórios")
+        self._json({'lancamentos': servico.livro_no_momento(self.consulta['momento'],
+                                                            _periodo(self.consulta['periodo']))})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API HTTP/JSON do Livro Caixa')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8502)
+    args = parser.parse_args()
+
+    garantir_schema()
+    servidor = ThreadingHTTPServer((args.host, args.porta), Manipulador)
+    print(f'API do Livro Caixa em http://{args.host}:{args.porta}')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+# Algoritmo e custos do hash de senhas (ajustáveis por variável de ambiente).
+# scrypt: memória ~ 128 * n * r bytes por hash; pbkdf2: custo linear nas iterações.
+ALGORITMO = os.environ.get('LIVRO_CAIXA_HASH', 'scrypt')
+SCRYPT_N = int(os.environ.get('LIVRO_CAIXA_SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('LIVRO_CAIXA_SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('LIVRO_CAIXA_SCRYPT_P', 1))
+PBKDF2_ITERACOES = int(os.environ.get('LIVRO_CAIXA_PBKDF2_ITERACOES', 600_000))
+TAMANHO_SAL = 16
+
+# Hashes calculados ao mesmo tempo: logins simultâneos esperam a vez em vez de
+# disputarem CPU e memória, mantendo a latência de cada login previsível
+HASHES_SIMULTANEOS = int(os.environ.get('LIVRO_CAIXA_HASHES_SIMULTANEOS', os.cpu_count() or 2))
+_limite_hashes = threading.BoundedSemaphore(HASHES_SIMULTANEOS)
+
+# Validade dos tokens de sessão (segundos). Curta porque o token fica em um cookie gravado por
+# script (sem HttpOnly) e vale como senha até expirar; a sessão aberta no navegador não depende dele
+VALIDADE_SESSAO = int(os.environ.get('LIVRO_CAIXA_VALIDADE_SESSAO', 2 * 3600))
+
+# Caracteres de marcação HTML, recusados nos nomes de usuário (exibidos nas páginas)
+CARACTERES_PROIBIDOS = '<>&"\''
+
+
+def validar_username(username):
+    """Levanta ValueError se o nome de usuário for vazio ou tiver caracteres de marcação HTML"""
+    if not str(username or '').strip():
+        raise ValueError("nome de usuário vazio")
+    proibidos = [caractere for caractere in CARACTERES_PROIBIDOS if caractere in username]
+    if proibidos:
+        raise ValueError(f"o nome de usuário não pode conter {' '.join(proibidos)}")
+
+
+def _b64(dados):
+    return base64.urlsafe_b64encode(dados).rstrip(b'=').decode()
+
+
+def _de_b64(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+
+def _derivar(senha, algoritmo, parametros, sal):
+    """Calcula a chave derivada da senha com o algoritmo e os parâmetros informados"""
+    with _limite_hashes:
+        if algoritmo == 'scrypt':
+            n, r, p = parametros
+            return hashlib.scrypt(senha.encode(), salt=sal, n=n, r=r, p=p,
+                                  maxmem=256 * n * r * p, dklen=32)
+        if algoritmo == 'pbkdf2_sha256':
+            (iteracoes,) = parametros
+            return hashlib.pbkdf2_hmac('sha256', senha.encode(), sal, iteracoes)
+    raise ValueError(f"Algoritmo de hash desconhecido: {algoritmo}")
+
+
+def _parametros_atuais():
+    if ALGORITMO == 'scrypt':
+        return 'scrypt', (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return 'pbkdf2_sha256', (PBKDF2_ITERACOES,)
+
+
+def gerar_hash(senha):
+    """Gera o hash salgado da senha no formato algoritmo$parâmetros$sal$hash"""
+    algoritmo, parametros = _parametros_atuais()
+    sal = secrets.token_bytes(TAMANHO_SAL)
+    chave = _derivar(senha, algoritmo, parametros, sal)
+    return '$'.join([algoritmo, ','.join(map(str, parametros)), _b64(sal), _b64(chave)])
+
+
+def verificar_senha(senha, hash_armazenado):
+    """Verifica a senha contra um hash novo ou contra o SHA-256 legado (sem sal)"""
+    if '$' not in hash_armazenado:
+        legado = hashlib.sha256(senha.encode()).hexdigest()
+        return hmac.compare_digest(legado, hash_armazenado)
+    try:
+        algoritmo, parametros, sal, chave = hash_armazenado.split('$')
+        parametros = tuple(int(valor) for valor in parametros.split(','))
+        calculada = _derivar(senha, algoritmo, parametros, _de_b64(sal))
+    except ValueError:
+        return False
+    return hmac.compare_digest(calculada, _de_b64(chave))
+
+
+def precisa_rehash(hash_armazenado):
+    """Indica se o hash é legado ou usa custos diferentes dos configurados"""
+    algoritmo, parametros = _parametros_atuais()
+    prefixo = f"{algoritmo}${','.join(map(str, parametros))}$"
+    return not hash_armazenado.startswith(prefixo)
+
+
+def medir_custo(repeticoes=5):
+    """Mede o tempo médio (ms) de um hash com os custos configurados"""
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        gerar_hash('senha de teste')
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+# Tokens de sessão: username|expiração|impressão do hash da senha, assinados com HMAC.
+# A impressão do hash invalida os tokens quando a senha muda (ou é re-hasheada).
+def _impressao(segredo, hash_senha):
+    return _b64(hmac.new(segredo, hash_senha.encode(), hashlib.sha256).digest()[:12])
+
+
+def _assinatura(segredo, conteudo):
+    return _b64(hmac.new(segredo, conteudo.encode(), hashlib.sha256).digest())
+
+
+def criar_token(segredo, username, hash_senha, validade=VALIDADE_SESSAO):
+    """Cria um token de sessão assinado para o usuário"""
+    conteudo = '|'.join([_b64(username.encode()), str(int(time.time()) + validade),
+                         _impressao(segredo, hash_senha)])
+    return f'{conteudo}.{_assinatura(segredo, conteudo)}'
+
+
+def ler_token(segredo, token):
+    """Retorna (username, impressão) de um token válido e não expirado, ou None"""
+    conteudo, _, assinatura = str(token or '').rpartition('.')
+    if not conteudo or not hmac.compare_digest(assinatura.encode(), _assinatura(segredo, conteudo).encode()):
+        return None
+    try:
+        username, expira, impressao = conteudo.split('|')
+        if int(expira) < time.time():
+            return None
+        return _de_b64(username).decode(), impressao
+    except ValueError:
+        return None
+
+
+def token_confere(segredo, impressao, hash_senha):
+    """Confere se o token foi emitido para o hash de senha atual do usuário"""
+    return hmac.compare_digest(impressao, _impressao(segredo, hash_senha))
+
+
+def criar_tabela_segredos(conn):
+    """Cria a tabela com a chave de assinatura das sessões (compartilhada entre processos)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS segredos (
+            nome TEXT PRIMARY KEY,
+            valor TEXT NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO segredos (nome, valor) VALUES ('sessao', ?)",
+                 (secrets.token_hex(32),))
+
+
+def segredo_sessao(conn):
+    """Lê a chave de assinatura dos tokens de sessão"""
+    return bytes.fromhex(conn.execute("SELECT valor FROM segredos WHERE nome = 'sessao'").fetchone()[0])
+
+
+if __name__ == '__main__':
+    algoritmo, parametros = _parametros_atuais()
+    print(f'{algoritmo} {parametros}: {medir_custo():.1f} ms por hash '
+          f'({HASHES_SIMULTANEOS} hashes simultâneos)')
@@ -0,0 +1,249 @@
+"""Benchmark das operações críticas do Livro Caixa sobre livros sintéticos (sem Streamlit).
+
+Uso:
+    python benchmark.py                                  # 10k, 100k e 1M lançamentos
+    python benchmark.py --tamanhos 10000 --repeticoes 3 --saida resultado.json
+    python benchmark.py --comparar anterior.json         # falha se alguma operação ficou mais lenta
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import database
+import escrita
+import servico
+from database import (conexao, transacao, fechar_conexoes, recalcular_saldos, transportar_saldos,
+                      inserir_lancamento, alterar_lancamento, remover_lancamento,
+                      periodo_da_data, nome_mes, SQL_INSERIR_LANCAMENTO, SQL_LANCAMENTOS_MES, SQL_RESUMO_MENSAL,
+                      SQL_RESUMO_CONTAS, registrar_foto, livro_em)
+from exportacao import zip_ano
+from migracoes import aplicar_migracoes, CONTAS_PADRAO
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000]
+LANCAMENTOS_POR_ANO = 100_000  # densidade do livro sintético (o 1M ocupa 10 anos)
+TAMANHO_LOTE_GERACAO = 10_000
+SESSOES_CONCORRENTES = 8     # sessões gravando ao mesmo tempo na medida de contenção
+ESCRITAS_POR_SESSAO = 25
+
+
+def gerar_livro(conn, quantidade, semente=42):
+    """Preenche o banco com `quantidade` lançamentos aleatórios (reprodutíveis pela semente)"""
+    aleatorio = random.Random(semente)
+    anos = max(1, -(-quantidade // LANCAMENTOS_POR_ANO))
+    inicio = date(date.today().year - anos, 1, 1)
+    dias = (date(inicio.year + anos, 1, 1) - inicio).days
+    contas = dict(conn.execute('SELECT nome, id FROM contas'))
+
+    # Datas sorteadas e ordenadas: os ids crescem com a data, como em um livro real
+    datas = sorted(inicio + timedelta(days=aleatorio.randrange(dias)) for _ in range(quantidade))
+    periodos = set()
+    for posicao in range(0, quantidade, TAMANHO_LOTE_GERACAO):
+        linhas = []
+        for data in datas[posicao:posicao + TAMANHO_LOTE_GERACAO]:
+            periodo = periodo_da_data(data)
+            periodos.add(periodo)
+            valor = aleatorio.randrange(100, 500_001)  # centavos
+            entrada = aleatorio.random() < 0.4
+            conta = aleatorio.choice(CONTAS_PADRAO)
+            linhas.append((nome_mes(periodo), periodo, str(data), conta,
+                           f'NF {aleatorio.randrange(100000)}' if aleatorio.random() < 0.5 else '',
+                           valor if entrada else 0, 0 if entrada else valor, contas[conta]))
+        conn.executemany(SQL_INSERIR_LANCAMENTO, linhas)
+
+    for periodo in periodos:
+        recalcular_saldos(conn, periodo, transportar=False)
+    transportar_saldos(conn, min(periodos))
+    return sorted(periodos)
+
+
+def medir(funcao, repeticoes):
+    """Executa a função `repeticoes` vezes e retorna os tempos (ms) e o último resultado"""
+    tempos, resultado = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'repeticoes': repeticoes,
+        'min_ms': min(tempos),
+        'mediana_ms': statistics.median(tempos),
+        'max_ms': max(tempos),
+    }, resultado
+
+
+def executar(quantidade, repeticoes, diretorio):
+    """Gera um livro com `quantidade` lançamentos e mede as operações críticas"""
+    database.DB_PATH = os.path.join(diretorio, f'benchmark_{quantidade}.db')
+    fechar_conexoes()
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(database.DB_PATH + sufixo):
+            os.remove(database.DB_PATH + sufixo)
+
+    resultados = {}
+    inicio = time.perf_counter()
+    with transacao() as conn:
+        aplicar_migracoes(conn)
+        periodos = gerar_livro(conn, quantidade)
+        # Livro gerado de uma vez: a foto evita que a primeira escrita medida dispare a periódica
+        registrar_foto(conn)
+    resultados['geracao_s'] = time.perf_counter() - inicio
+
+    aleatorio = random.Random(1)
+    primeiro, meio, ultimo = periodos[0], periodos[len(periodos) // 2], periodos[-1]
+    data_recente = f'{ultimo // 100}-{ultimo % 100:02d}-01'
+    with conexao() as conn:
+        id_antigo, data_antiga = conn.execute(
+            'SELECT id, data FROM lancamentos WHERE periodo = ? ORDER BY data, id LIMIT 1', (primeiro,)).fetchone()
+
+    def ler_mes():
+        with conexao() as conn:
+            return pd.read_sql(SQL_LANCAMENTOS_MES, conn, params=(meio,))
+
+    def salvar():
+        with transacao() as conn:
+            return inserir_lancamento(conn, data_recente, 'Benchmark', '', 1000, 0)
+
+    def atualizar_antigo():
+        # Primeiro lançamento do livro: recalcula o mês inteiro e transporta o saldo por todos os meses
+        with transacao() as conn:
+            return alterar_lancamento(conn, id_antigo, data_antiga, 'Benchmark', '',
+                                      aleatorio.randrange(100, 500_001), 0)
+
+    def excluir_antigo():
+        with transacao() as conn:
+            lancamento_id = inserir_lancamento(conn, data_antiga, 'Benchmark', '', 100, 0)
+        inicio_exclusao = time.perf_counter()
+        with transacao() as conn:
+            remover_lancamento(conn, lancamento_id)
+        return time.perf_counter() - inicio_exclusao
+
+    def salvar_concorrente():
+        # Várias sessões gravando ao mesmo tempo, pelo escritor único (commits em grupo)
+        def sessao():
+            for _ in range(ESCRITAS_POR_SESSAO):
+                servico.novo_lancamento(data_recente, 'Benchmark', '', 1000, 0)
+        sessoes = [threading.Thread(target=sessao) for _ in range(SESSOES_CONCORRENTES)]
+        for thread in sessoes:
+            thread.start()
+        for thread in sessoes:
+            thread.join()
+
+    def balanco():
+        with conexao() as conn:
+            return pd.read_sql(SQL_RESUMO_MENSAL, conn, params={'ano': meio // 100})
+
+    def balanco_contas():
+        with conexao() as conn:
+            return pd.read_sql(SQL_RESUMO_CONTAS, conn, params={'ano': meio // 100})
+
+    def livro_no_momento():
+        # Reconstrução pelo diário de auditoria: foto mais recente + alterações posteriores
+        with conexao() as conn:
+            momento = conn.execute("SELECT strftime('%Y-%m-%d %H:%M:%f', 'now')").fetchone()[0]
+            return livro_em(conn, momento, meio)
+
+    def exportar():
+        with conexao() as conn:
+            arquivo = zip_ano(conn, meio // 100, CONTAS_PADRAO)
+        arquivo.seek(0, os.SEEK_END)
+        tamanho = arquivo.tell()
+        arquivo.close()
+        return tamanho
+
+    resultados['get_lancamentos_mes'], df_mes = medir(ler_mes, repeticoes)
+    resultados['get_lancamentos_mes']['linhas'] = len(df_mes)
+    resultados['salvar_lancamento'], _ = medir(salvar, repeticoes)
+    resultados['atualizar_lancamento_antigo'], _ = medir(atualizar_antigo, repeticoes)
+
+    # A exclusão mede só o DELETE + recálculo (a inserção de preparo fica de fora)
+    tempos_exclusao = [excluir_antigo() * 1000 for _ in range(repeticoes)]
+    resultados['excluir_lancamento_antigo'] = {
+        'repeticoes': repeticoes,
+        'min_ms': min(tempos_exclusao),
+        'mediana_ms': statistics.median(tempos_exclusao),
+        'max_ms': max(tempos_exclusao),
+    }
+
+    antes = escrita.estatisticas()
+    resultados['salvar_concorrente'], _ = medir(salvar_concorrente, repeticoes)
+    depois = escrita.estatisticas()
+    escritas = SESSOES_CONCORRENTES * ESCRITAS_POR_SESSAO
+    resultados['salvar_concorrente']['escritas'] = escritas
+    resultados['salvar_concorrente']['escritas_por_s'] = escritas / (resultados['salvar_concorrente']['mediana_ms'] / 1000)
+    resultados['salvar_concorrente']['pedidos_por_grupo'] = (
+        (depois['pedidos'] - antes['pedidos']) / max(depois['grupos'] - antes['grupos'], 1))
+
+    resultados['balanco_anual'], _ = medir(balanco, repeticoes)
+    resultados['balanco_por_conta'], _ = medir(balanco_contas, repeticoes)
+    resultados['livro_no_momento'], _ = medir(livro_no_momento, repeticoes)
+    resultados['exportar_para_csv'], tamanho_zip = medir(exportar, repeticoes)
+    resultados['exportar_para_csv']['bytes'] = tamanho_zip
+
+    fechar_conexoes()
+    resultados['tamanho_banco_mb'] = os.path.getsize(database.DB_PATH) / 1024 / 1024
+    return resultados
+
+
+def comparar(atual, anterior, tolerancia):
+    """Lista as operações cuja mediana piorou mais que a tolerância em relação ao arquivo anterior"""
+    regressoes = []
+    for tamanho, operacoes in atual['resultados'].items():
+        for nome, medida in operacoes.items():
+            referencia = anterior.get('resultados', {}).get(tamanho, {}).get(nome)
+            if not isinstance(medida, dict) or not isinstance(referencia, dict):
+                continue
+            razao = medida['mediana_ms'] / max(referencia['mediana_ms'], 1e-9)
+            print(f'{tamanho:>9} {nome:<30} {referencia["mediana_ms"]:10.2f} -> {medida["mediana_ms"]:10.2f} ms'
+                  f' ({razao:.2f}x)')
+            if razao > 1 + tolerancia:
+                regressoes.append((tamanho, nome, razao))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das operações críticas do Livro Caixa')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--saida', default='benchmark.json')
+    parser.add_argument('--diretorio', default=None, help='onde criar os bancos sintéticos (padrão: temporário)')
+    parser.add_argument('--comparar', default=None, help='resultado anterior (JSON) para detectar regressões')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='piora máxima aceita na mediana (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    diretorio = args.diretorio or tempfile.mkdtemp(prefix='livro_caixa_benchmark_')
+    relatorio = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'resultados': {},
+    }
+    for quantidade in args.tamanhos:
+        print(f'Gerando e medindo {quantidade} lançamentos...', file=sys.stderr)
+        relatorio['resultados'][str(quantidade)] = executar(quantidade, args.repeticoes, diretorio)
+
+    with open(args.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    print(f'Resultados gravados em {args.saida}', file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            regressoes = comparar(relatorio, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print(f'{len(regressoes)} operação(ões) acima da tolerância', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,992 @@
+import os
+import queue
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from desempenho import registrar_consulta
+from dinheiro import centavos
+
+# Caminho do banco de dados (pode ser sobrescrito pela variável de ambiente)
+DB_PATH = os.environ.get('LIVRO_CAIXA_DB', 'livro_caixa.db')
+
+# Quantidade máxima de conexões ociosas mantidas no pool
+POOL_SIZE = 8
+
+# Tempo máximo (ms) que uma conexão espera pelo lock de escrita
+BUSY_TIMEOUT_MS = 5000
+
+# PRAGMAs aplicados em cada nova conexão
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),        # ~16 MB de cache de páginas
+    ('mmap_size', 268435456),      # 256 MB mapeados em memória
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('foreign_keys', 'ON'),        # lancamentos.conta_id -> contas.id
+)
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+
+
+class _Cursor(sqlite3.Cursor):
+    """Cursor que mede a quantidade e a duração das consultas do rerun em andamento.
+    Conta o execute (onde o SQLite ordena/agrega) e os fetch*; a iteração linha a linha
+    fica no span da função que consome o cursor."""
+
+    def execute(self, *args):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            registrar_consulta(time.perf_counter() - inicio)
+
+    def executemany(self, *args):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            registrar_consulta(time.perf_counter() - inicio)
+
+    def executescript(self, *args):
+        inicio = time.perf_counter()
+        try:
+            return super().executescript(*args)
+        finally:
+            registrar_consulta(time.perf_counter() - inicio)
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            registrar_consulta(time.perf_counter() - inicio, quantidade=0)
+
+
+class _Conexao(sqlite3.Connection):
+    """Conexão do pool que registra as versões de dados alteradas na transação corrente
+    e, dentro de recalculo_agrupado, os recálculos de saldo adiados para o fim do grupo"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.versoes_alteradas = {}
+        self.recalculos_adiados = None  # período -> posição (data, id) mais antiga a recalcular
+        self.transporte_adiado = None   # período mais antigo a transportar
+
+    def cursor(self, factory=_Cursor):
+        return super().cursor(factory)
+
+    # Connection.execute* do sqlite3 criam o cursor em C, sem passar por cursor(): sem estes
+    # atalhos as consultas feitas com conn.execute(...) ficariam fora da medição do rerun
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+
+def _nova_conexao():
+    """Abre uma nova conexão já configurada com os PRAGMAs"""
+    # isolation_level=None: as transações são controladas explicitamente por transacao()
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, factory=_Conexao,
+                           check_same_thread=False, isolation_level=None)
+    for nome, valor in PRAGMAS:
+        conn.execute(f'PRAGMA {nome} = {valor}')
+    return conn
+
+
+def _obter_conexao():
+    """Retira uma conexão do pool ou cria uma nova"""
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return _nova_conexao()
+
+
+def _devolver_conexao(conn):
+    """Devolve a conexão ao pool (ou fecha, se o pool estiver cheio)"""
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+@contextmanager
+def conexao():
+    """Empresta uma conexão do pool para leituras"""
+    conn = _obter_conexao()
+    try:
+        yield conn
+    finally:
+        _devolver_conexao(conn)
+
+
+@contextmanager
+def transacao():
+    """Executa um bloco dentro de uma transação de escrita (commit ou rollback automático)"""
+    conn = _obter_conexao()
+    try:
+        # IMMEDIATE reserva o lock de escrita já no início, evitando deadlocks de upgrade
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+            # Só depois do commit as novas versões passam a valer neste processo
+            for tabela, versao in conn.versoes_alteradas.items():
+                _registrar_versao(tabela, versao)
+    finally:
+        conn.versoes_alteradas.clear()
+        _devolver_conexao(conn)
+
+
+def fechar_conexoes():
+    """Fecha todas as conexões ociosas do pool"""
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+# Versões dos dados: contador monotônico por tabela, usado como chave dos caches de leitura.
+# Fica no próprio banco para que vários processos do servidor enxerguem as mesmas alterações.
+VERSAO_TTL = 2.0  # segundos entre releituras da versão gravada por outros processos
+
+_versoes = {}  # tabela -> (versão, instante da leitura)
+
+
+def criar_tabela_versoes(conn):
+    """Cria a tabela com os contadores de versão dos dados"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS versoes_dados (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL
+        )
+    ''')
+
+
+def marcar_alteracao(conn, tabela):
+    """Incrementa a versão dos dados de uma tabela dentro da transação corrente"""
+    versao = conn.execute('''
+        INSERT INTO versoes_dados (tabela, versao) VALUES (?, 1)
+        ON CONFLICT (tabela) DO UPDATE SET versao = versao + 1
+        RETURNING versao
+    ''', (tabela,)).fetchone()[0]
+    conn.versoes_alteradas[tabela] = versao
+
+
+def _registrar_versao(tabela, versao):
+    """Guarda a versão conhecida de uma tabela (nunca retrocede)"""
+    atual = _versoes.get(tabela)
+    if atual is None or versao >= atual[0]:
+        _versoes[tabela] = (versao, time.monotonic())
+
+
+def versao_dados(tabela):
+    """Retorna a versão atual dos dados de uma tabela"""
+    atual = _versoes.get(tabela)
+    if atual is not None and time.monotonic() - atual[1] < VERSAO_TTL:
+        return atual[0]
+    with conexao() as conn:
+        linha = conn.execute('SELECT versao FROM versoes_dados WHERE tabela = ?', (tabela,)).fetchone()
+    versao = linha[0] if linha else 0
+    _registrar_versao(tabela, versao)
+    return versao
+
+
+# Períodos contábeis: chave inteira AAAAMM derivada da data do lançamento
+MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
+         "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+
+def periodo_de(ano, mes):
+    """Retorna a chave do período (AAAAMM) para um ano e nome de mês"""
+    return int(ano) * 100 + MESES.index(mes) + 1
+
+
+def periodo_da_data(data):
+    """Retorna a chave do período (AAAAMM) de uma data (date ou texto AAAA-MM-DD)"""
+    texto = str(data)
+    return int(texto[:4]) * 100 + int(texto[5:7])
+
+
+def nome_mes(periodo):
+    """Retorna o nome do mês de uma chave de período"""
+    return MESES[periodo % 100 - 1]
+
+
+# Saldos: lancamentos.saldo guarda o acumulado dentro do período e period_summary.saldo_inicial
+# o saldo transportado do período anterior (checkpoint). O saldo exibido é a soma dos dois, de
+# modo que uma alteração em um mês passado só atualiza os checkpoints dos meses seguintes.
+SQL_SALDO_EXIBIDO = '''lancamentos.saldo + COALESCE((
+    SELECT saldo_inicial FROM period_summary
+    WHERE period_summary.periodo = lancamentos.periodo), 0)'''
+
+# Nome da conta do lançamento (NULL quando não há conta vinculada)
+SQL_NOME_CONTA = '(SELECT nome FROM contas WHERE contas.id = lancamentos.conta_id)'
+
+# Consultas críticas (compartilhadas com a verificação dos planos de consulta)
+SQL_LANCAMENTOS_MES = f'''
+    SELECT id, mes, periodo, data, historico, complemento, entrada, saida,
+           {SQL_SALDO_EXIBIDO} AS saldo, created_at
+    FROM lancamentos WHERE periodo = ? ORDER BY data, id
+'''
+
+SQL_RECALCULAR_SALDOS = '''
+    WITH anterior AS (
+        SELECT COALESCE((
+            SELECT saldo FROM lancamentos
+            WHERE periodo = :periodo AND (data, id) < (:data, :id)
+            ORDER BY data DESC, id DESC LIMIT 1
+        ), 0) AS saldo
+    ),
+    novos AS (
+        SELECT id,
+               (SELECT saldo FROM anterior)
+               + SUM(entrada - saida) OVER (ORDER BY data, id) AS saldo
+        FROM lancamentos
+        WHERE periodo = :periodo AND (data, id) >= (:data, :id)
+    )
+    UPDATE lancamentos SET saldo = novos.saldo
+    FROM novos
+    WHERE lancamentos.id = novos.id AND lancamentos.saldo IS NOT novos.saldo
+'''
+
+SQL_LIMPAR_MES = "DELETE FROM lancamentos WHERE periodo = ?"
+
+# Colunas já no formato da exportação CSV (data dd/mm/aaaa, centavos convertidos em reais)
+SQL_EXPORTAR_MES = f'''
+    SELECT strftime('%d/%m/%Y', data), historico, complemento, {SQL_NOME_CONTA},
+           printf('%.2f', entrada / 100.0), printf('%.2f', saida / 100.0),
+           printf('%.2f', ({SQL_SALDO_EXIBIDO}) / 100.0)
+    FROM lancamentos WHERE periodo = ? ORDER BY data, id
+'''
+
+# Totais, saldo final e quantidade de lançamentos por mês do ano, lidos do resumo materializado
+SQL_RESUMO_MENSAL = '''
+    SELECT periodo, entradas, saidas, saldo_inicial, saldo_final AS saldo, lancamentos
+    FROM period_summary
+    WHERE periodo BETWEEN :ano * 100 + 1 AND :ano * 100 + 12
+    ORDER BY periodo
+'''
+
+SQL_ANOS = "SELECT DISTINCT periodo / 100 AS ano FROM period_summary ORDER BY ano"
+
+# Total de lançamentos e de meses com dados (uma linha por período)
+SQL_TOTAIS_GERAIS = "SELECT COALESCE(SUM(lancamentos), 0), COUNT(*) FROM period_summary"
+
+# Listagem paginada: só as colunas exibidas, com cursor (data, id) exclusivo
+COLUNAS_LISTAGEM = ('id', 'data', 'historico', 'complemento', 'conta', 'entrada', 'saida', 'saldo')
+
+SQL_PAGINA = f'''
+    SELECT id, data, historico, complemento, {SQL_NOME_CONTA} AS conta, entrada, saida,
+           {SQL_SALDO_EXIBIDO} AS saldo
+    FROM lancamentos
+    WHERE {{filtros}} AND (data, id) > (?, ?)
+    ORDER BY data, id LIMIT ?
+'''
+
+# SUM (e não TOTAL) mantém as somas de centavos inteiras
+SQL_TOTAIS_FILTRADOS = """
+    SELECT COUNT(*), COALESCE(SUM(entrada), 0), COALESCE(SUM(saida), 0) FROM lancamentos WHERE {filtros}
+"""
+
+
+def filtros_lancamentos(periodo, data_inicio=None, data_fim=None, texto=None,
+                        valor_minimo=None, valor_maximo=None, tipo=None):
+    """Monta a condição WHERE (e os parâmetros) dos filtros da listagem de um período"""
+    condicoes, params = ['periodo = ?'], [periodo]
+    if data_inicio:
+        condicoes.append('data >= ?')
+        params.append(str(data_inicio))
+    if data_fim:
+        condicoes.append('data <= ?')
+        params.append(str(data_fim))
+    if texto:
+        padrao = '%' + texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        condicoes.append("(historico LIKE ? ESCAPE '\\' OR complemento LIKE ? ESCAPE '\\')")
+        params += [padrao, padrao]
+    # O valor de um lançamento é a entrada ou a saída (a outra é zero)
+    if valor_minimo is not None:
+        condicoes.append('entrada + saida >= ?')
+        params.append(valor_minimo)
+    if valor_maximo is not None:
+        condicoes.append('entrada + saida <= ?')
+        params.append(valor_maximo)
+    if tipo == 'entrada':
+        condicoes.append('entrada > 0')
+    elif tipo == 'saida':
+        condicoes.append('saida > 0')
+    return ' AND '.join(condicoes), params
+
+
+def buscar_pagina(conn, filtros, apos=None, tamanho=50):
+    """Busca até `tamanho` + 1 lançamentos após o cursor (data, id); a linha extra indica se há próxima página"""
+    condicao, params = filtros
+    data_cursor, id_cursor = apos if apos else ('', 0)
+    return conn.execute(SQL_PAGINA.format(filtros=condicao),
+                        params + [str(data_cursor), id_cursor, tamanho + 1]).fetchall()
+
+
+def totais_filtrados(conn, filtros):
+    """Retorna (quantidade, entradas, saídas) dos lançamentos que atendem aos filtros"""
+    condicao, params = filtros
+    return conn.execute(SQL_TOTAIS_FILTRADOS.format(filtros=condicao), params).fetchone()
+
+
+# Transporte de saldos: o saldo final de cada período vira o saldo inicial do seguinte,
+# recalculado só nos checkpoints (uma linha por período) a partir do período alterado
+SQL_TRANSPORTAR_SALDOS = '''
+    WITH anterior AS (
+        SELECT COALESCE((
+            SELECT saldo_final FROM period_summary
+            WHERE periodo < :periodo ORDER BY periodo DESC LIMIT 1
+        ), 0) AS saldo
+    ),
+    novos AS (
+        SELECT periodo,
+               (SELECT saldo FROM anterior)
+               + SUM(entradas - saidas) OVER (ORDER BY periodo) AS saldo_final,
+               entradas - saidas AS movimento
+        FROM period_summary
+        WHERE periodo >= :periodo
+    )
+    UPDATE period_summary
+    SET saldo_inicial = novos.saldo_final - novos.movimento, saldo_final = novos.saldo_final
+    FROM novos
+    WHERE period_summary.periodo = novos.periodo
+      AND (period_summary.saldo_inicial IS NOT novos.saldo_final - novos.movimento
+           OR period_summary.saldo_final IS NOT novos.saldo_final)
+'''
+
+
+# Motor de saldos
+def recalcular_saldos(conn, periodo, a_partir_de=None, transportar=True):
+    """Recalcula os saldos do período a partir da posição (data, id) e transporta o saldo final"""
+    # Sem posição inicial, recalcula o período inteiro
+    data_inicio, id_inicio = a_partir_de if a_partir_de else ('', 0)
+    adiados = getattr(conn, 'recalculos_adiados', None)
+    if adiados is not None:
+        # Grupo de escritas: guarda só a posição mais antiga de cada período
+        posicao = (str(data_inicio), id_inicio)
+        adiados[periodo] = min(adiados.get(periodo, posicao), posicao)
+        if transportar:
+            transportar_saldos(conn, periodo)
+        return
+    conn.execute(SQL_RECALCULAR_SALDOS, {'periodo': periodo, 'data': str(data_inicio), 'id': id_inicio})
+    # Operações em lote desligam o transporte e o fazem uma vez, a partir do período mais antigo
+    if transportar:
+        transportar_saldos(conn, periodo)
+
+
+def transportar_saldos(conn, periodo):
+    """Atualiza os saldos inicial/final dos checkpoints a partir do período informado"""
+    if getattr(conn, 'recalculos_adiados', None) is not None:
+        conn.transporte_adiado = min(periodo, conn.transporte_adiado or periodo)
+        return
+    # Sem resumo (ex.: durante a migração de períodos) não há o que transportar
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'period_summary'").fetchone():
+        conn.execute(SQL_TRANSPORTAR_SALDOS, {'periodo': periodo})
+
+
+@contextmanager
+def recalculo_agrupado(conn):
+    """Adia os recálculos e transportes de saldo feitos no bloco e os executa no fim,
+    uma vez por período afetado (usado pelo escritor que agrupa várias escritas por commit)"""
+    conn.recalculos_adiados, conn.transporte_adiado = {}, None
+    try:
+        yield
+        periodos, transporte = conn.recalculos_adiados, conn.transporte_adiado
+    finally:
+        conn.recalculos_adiados, conn.transporte_adiado = None, None
+    for periodo, posicao in periodos.items():
+        recalcular_saldos(conn, periodo, posicao, transportar=False)
+    if transporte is not None:
+        transportar_saldos(conn, transporte)
+
+
+# Operações de escrita (sem interface): cada uma roda na transação recebida e marca a alteração.
+# Entradas e saídas são sempre centavos inteiros (veja dinheiro.centavos)
+SQL_INSERIR_LANCAMENTO = '''
+    INSERT INTO lancamentos (mes, periodo, data, historico, complemento, entrada, saida, conta_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_ALTERAR_LANCAMENTO = '''
+    UPDATE lancamentos
+    SET mes = ?, periodo = ?, data = ?, historico = ?, complemento = ?, entrada = ?, saida = ?, conta_id = ?
+    WHERE id = ?
+'''
+
+
+def inserir_lancamento(conn, data, historico, complemento, entrada, saida, conta_id=None):
+    """Insere um lançamento e corrige os saldos seguintes; retorna o id"""
+    periodo = periodo_da_data(data)
+    lancamento_id = conn.execute(SQL_INSERIR_LANCAMENTO, (nome_mes(periodo), periodo, str(data), historico,
+                                                          complemento, entrada, saida, conta_id)).lastrowid
+    # Lançamentos retroativos também corrigem os saldos seguintes
+    recalcular_saldos(conn, periodo, (data, lancamento_id))
+    marcar_alteracao(conn, 'lancamentos')
+    return lancamento_id
+
+
+def alterar_lancamento(conn, lancamento_id, data, historico, complemento, entrada, saida, conta_id=None):
+    """Altera um lançamento e recalcula os saldos; retorna False se ele não existe"""
+    lancamento = conn.execute('SELECT data, periodo FROM lancamentos WHERE id = ?', (lancamento_id,)).fetchone()
+    if not lancamento:
+        return False
+    data_anterior, periodo_anterior = lancamento
+    periodo = periodo_da_data(data)
+
+    conn.execute(SQL_ALTERAR_LANCAMENTO, (nome_mes(periodo), periodo, str(data), historico, complemento,
+                                          entrada, saida, conta_id, lancamento_id))
+
+    # Recalcular os saldos a partir da posição mais antiga (antes ou depois da edição)
+    if periodo == periodo_anterior:
+        recalcular_saldos(conn, periodo, (min(str(data_anterior), str(data)), 0))
+    else:
+        # O lançamento mudou de mês: os dois períodos são afetados
+        recalcular_saldos(conn, periodo_anterior, (data_anterior, 0))
+        recalcular_saldos(conn, periodo, (data, 0))
+    marcar_alteracao(conn, 'lancamentos')
+    return True
+
+
+def remover_lancamento(conn, lancamento_id):
+    """Exclui um lançamento e recalcula os saldos seguintes; retorna False se ele não existe"""
+    lancamento = conn.execute('SELECT data, periodo FROM lancamentos WHERE id = ?', (lancamento_id,)).fetchone()
+    if not lancamento:
+        return False
+    conn.execute('DELETE FROM lancamentos WHERE id = ?', (lancamento_id,))
+    recalcular_saldos(conn, lancamento[1], (lancamento[0], lancamento_id))
+    marcar_alteracao(conn, 'lancamentos')
+    return True
+
+
+# Migração: mês por nome (sem ano) -> período AAAAMM
+def migrar_periodos(conn):
+    """Adiciona a coluna periodo à tabela lancamentos e preenche os registros existentes"""
+    colunas = [linha[1] for linha in conn.execute('PRAGMA table_info(lancamentos)')]
+    if 'periodo' in colunas:
+        return
+    conn.execute('ALTER TABLE lancamentos ADD COLUMN periodo INTEGER')
+    conn.execute("UPDATE lancamentos SET periodo = CAST(strftime('%Y%m', data) AS INTEGER)")
+    # O índice antigo por nome de mês deixa de ser usado
+    conn.execute('DROP INDEX IF EXISTS idx_lancamentos_mes_data')
+    # Os saldos antigos misturavam anos diferentes no mesmo mês
+    for (periodo,) in conn.execute('SELECT DISTINCT periodo FROM lancamentos').fetchall():
+        recalcular_saldos(conn, periodo)
+
+
+# Migração: valores em reais (REAL) -> centavos inteiros (INTEGER)
+def migrar_centavos(conn):
+    """Recria lancamentos e period_summary com os valores em centavos e recalcula os saldos"""
+    tipos = {linha[1]: linha[2].upper() for linha in conn.execute('PRAGMA table_info(lancamentos)')}
+    if tipos.get('entrada') == 'INTEGER':
+        return
+    # O SQLite não muda o tipo de uma coluna (e a afinidade REAL transformaria os inteiros em
+    # float): a tabela é recriada com os mesmos ids, que o índice FTS usa como rowid
+    conn.execute('''
+        CREATE TABLE lancamentos_centavos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mes TEXT NOT NULL,
+            periodo INTEGER,
+            data DATE NOT NULL,
+            historico TEXT NOT NULL,
+            complemento TEXT,
+            entrada INTEGER NOT NULL DEFAULT 0,
+            saida INTEGER NOT NULL DEFAULT 0,
+            saldo INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Mesma regra de arredondamento da aplicação (dinheiro.centavos): ROUND(x * 100) no SQLite
+    # erraria valores como 1.005, cujo produto em ponto flutuante é 100.49999...
+    conn.create_function('centavos', 1, centavos, deterministic=True)
+    conn.execute('''
+        INSERT INTO lancamentos_centavos (id, mes, periodo, data, historico, complemento, entrada, saida, created_at)
+        SELECT id, mes, periodo, data, historico, complemento, centavos(entrada), centavos(saida), created_at
+        FROM lancamentos
+    ''')
+    # Ids de lançamentos já excluídos não devem ser reutilizados
+    sequencia = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'lancamentos'").fetchone()
+
+    # DROP TABLE leva junto os índices e os triggers (FTS e resumo), recriados logo abaixo
+    conn.execute('DROP TABLE lancamentos')
+    conn.execute('ALTER TABLE lancamentos_centavos RENAME TO lancamentos')
+    if sequencia:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'lancamentos'", sequencia)
+    conn.execute('DROP TABLE IF EXISTS period_summary')
+
+    criar_indices(conn)
+    criar_busca_textual(conn)
+    criar_resumo_periodos(conn)
+    # Saldos refeitos em aritmética inteira (sem o arredondamento acumulado dos floats)
+    for (periodo,) in conn.execute('SELECT periodo FROM period_summary').fetchall():
+        recalcular_saldos(conn, periodo, transportar=False)
+
+
+# Migração: lançamentos vinculados ao plano de contas
+def vincular_contas(conn):
+    """Adiciona lancamentos.conta_id (chave estrangeira para contas) e o índice dos resumos por conta"""
+    colunas = [linha[1] for linha in conn.execute('PRAGMA table_info(lancamentos)')]
+    if 'conta_id' not in colunas:
+        conn.execute('ALTER TABLE lancamentos ADD COLUMN conta_id INTEGER REFERENCES contas(id) ON DELETE SET NULL')
+        # Lançamentos cujo histórico é exatamente o nome de uma conta já ficam vinculados a ela
+        conn.execute('''
+            UPDATE lancamentos SET conta_id = contas.id
+            FROM contas WHERE contas.nome = lancamentos.historico
+        ''')
+    conn.execute(INDICE_CONTAS)
+
+
+# Busca textual (FTS5) em histórico e complemento, mantida por triggers
+SQL_BUSCA_TEXTUAL = f'''
+    SELECT lancamentos.id, lancamentos.data, lancamentos.historico, lancamentos.complemento,
+           {SQL_NOME_CONTA} AS conta, lancamentos.entrada, lancamentos.saida, {SQL_SALDO_EXIBIDO} AS saldo
+    FROM lancamentos_fts
+    JOIN lancamentos ON lancamentos.id = lancamentos_fts.rowid
+    WHERE lancamentos_fts MATCH :consulta
+      AND lancamentos.data BETWEEN :data_inicio AND :data_fim
+    ORDER BY lancamentos_fts.rank
+    LIMIT :limite
+'''
+
+
+def criar_busca_textual(conn):
+    """Cria o índice FTS5 de histórico/complemento e os triggers que o mantêm sincronizado"""
+    existe = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'lancamentos_fts'").fetchone()
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS lancamentos_fts USING fts5(
+            historico, complemento,
+            content='lancamentos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_fts_insert AFTER INSERT ON lancamentos BEGIN
+            INSERT INTO lancamentos_fts (rowid, historico, complemento)
+            VALUES (new.id, new.historico, new.complemento);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_fts_delete AFTER DELETE ON lancamentos BEGIN
+            INSERT INTO lancamentos_fts (lancamentos_fts, rowid, historico, complemento)
+            VALUES ('delete', old.id, old.historico, old.complemento);
+        END
+    ''')
+    # Só alterações de texto mexem no índice (recálculos de saldo não)
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS lancamentos_fts_update
+        AFTER UPDATE OF historico, complemento ON lancamentos BEGIN
+            INSERT INTO lancamentos_fts (lancamentos_fts, rowid, historico, complemento)
+            VALUES ('delete', old.id, old.historico, old.complemento);
+            INSERT INTO lancamentos_fts (rowid, historico, complemento)
+            VALUES (new.id, new.historico, new.complemento);
+        END
+    ''')
+    if not existe:
+        # Indexa os lançamentos que já existiam
+        conn.execute("INSERT INTO lancamentos_fts (lancamentos_fts) VALUES ('rebuild')")
+
+
+def consulta_fts(texto):
+    """Converte o texto digitado em uma consulta FTS5 (todas as palavras, por prefixo)"""
+    termos = texto.split()
+    return ' '.join('"' + termo.replace('"', '""') + '"*' for termo in termos)
+
+
+def buscar_texto(conn, texto, data_inicio=None, data_fim=None, limite=200):
+    """Busca lançamentos de todos os períodos pelo texto, ordenados por relevância (bm25)"""
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    return conn.execute(SQL_BUSCA_TEXTUAL, {
+        'consulta': consulta,
+        'data_inicio': str(data_inicio or '0000-00-00'),
+        'data_fim': str(data_fim or '9999-99-99'),
+        'limite': limite,
+    }).fetchall()
+
+
+# Resumo materializado por período (entradas, saídas, saldos inicial/final e quantidade),
+# mantido por triggers em lancamentos para que os painéis leiam uma linha por mês
+SQL_AGREGAR_PERIODOS = '''
+    SELECT periodo, SUM(entrada), SUM(saida),
+           SUM(SUM(entrada) - SUM(saida)) OVER (ORDER BY periodo) - (SUM(entrada) - SUM(saida)),
+           SUM(SUM(entrada) - SUM(saida)) OVER (ORDER BY periodo),
+           COUNT(*)
+    FROM lancamentos GROUP BY periodo
+'''
+
+TRIGGERS_RESUMO = ('period_summary_insert', 'period_summary_delete', 'period_summary_update')
+
+
+def criar_resumo_periodos(conn):
+    """Cria a tabela period_summary e os triggers que a mantêm atualizada"""
+    colunas = [linha[1] for linha in conn.execute('PRAGMA table_info(period_summary)')]
+    reconstruir = not colunas
+    if colunas and 'saldo_inicial' not in colunas:
+        # Resumo anterior ao transporte de saldos: triggers e valores são refeitos
+        conn.execute('ALTER TABLE period_summary ADD COLUMN saldo_inicial INTEGER NOT NULL DEFAULT 0')
+        for trigger in TRIGGERS_RESUMO:
+            conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        reconstruir = True
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS period_summary (
+            periodo INTEGER PRIMARY KEY,
+            entradas INTEGER NOT NULL DEFAULT 0,
+            saidas INTEGER NOT NULL DEFAULT 0,
+            saldo_final INTEGER NOT NULL DEFAULT 0,
+            lancamentos INTEGER NOT NULL DEFAULT 0,
+            saldo_inicial INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Saldo final = saldo inicial + entradas - saídas; um período novo começa com o saldo
+    # final do anterior, e o transporte para os meses seguintes fica com transportar_saldos
+    somar_novo = '''
+            INSERT INTO period_summary (periodo, entradas, saidas, saldo_inicial, saldo_final, lancamentos)
+            SELECT new.periodo, new.entrada, new.saida, anterior.saldo,
+                   anterior.saldo + new.entrada - new.saida, 1
+            FROM (SELECT COALESCE((SELECT saldo_final FROM period_summary
+                                   WHERE periodo < new.periodo ORDER BY periodo DESC LIMIT 1), 0) AS saldo
+                 ) AS anterior
+            WHERE true
+            ON CONFLICT (periodo) DO UPDATE SET
+                entradas = entradas + excluded.entradas,
+                saidas = saidas + excluded.saidas,
+                saldo_final = saldo_final + excluded.entradas - excluded.saidas,
+                lancamentos = lancamentos + 1;
+    '''
+    subtrair_antigo = '''
+            UPDATE period_summary SET
+                entradas = entradas - old.entrada,
+                saidas = saidas - old.saida,
+                saldo_final = saldo_final - (old.entrada - old.saida),
+                lancamentos = lancamentos - 1
+            WHERE periodo = old.periodo;
+            DELETE FROM period_summary WHERE periodo = old.periodo AND lancamentos <= 0;
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS period_summary_insert AFTER INSERT ON lancamentos BEGIN
+            {somar_novo}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS period_summary_delete AFTER DELETE ON lancamentos BEGIN
+            {subtrair_antigo}
+        END
+    ''')
+    # Recálculos de saldo não mexem em periodo/entrada/saida e não disparam o trigger
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS period_summary_update
+        AFTER UPDATE OF periodo, entrada, saida ON lancamentos BEGIN
+            {subtrair_antigo}
+            {somar_novo}
+        END
+    ''')
+    if reconstruir:
+        reconstruir_resumo_periodos(conn)
+
+
+def reconstruir_resumo_periodos(conn):
+    """Recalcula todo o resumo por período a partir dos lançamentos"""
+    conn.execute('DELETE FROM period_summary')
+    conn.execute('''
+        INSERT INTO period_summary (periodo, entradas, saidas, saldo_inicial, saldo_final, lancamentos)
+    ''' + SQL_AGREGAR_PERIODOS)
+
+
+def verificar_resumo_periodos(conn, tolerancia=0):
+    """Compara o resumo materializado com os lançamentos e retorna os períodos divergentes"""
+    esperado = {linha[0]: linha[1:] for linha in conn.execute(SQL_AGREGAR_PERIODOS)}
+    atual = {linha[0]: linha[1:] for linha in conn.execute(
+        'SELECT periodo, entradas, saidas, saldo_inicial, saldo_final, lancamentos FROM period_summary')}
+    divergentes = []
+    for periodo in sorted(esperado.keys() | atual.keys()):
+        valores_esperados, valores_atuais = esperado.get(periodo), atual.get(periodo)
+        if (valores_esperados is None or valores_atuais is None
+                or any(abs(a - b) > tolerancia for a, b in zip(valores_esperados, valores_atuais))):
+            divergentes.append((periodo, valores_esperados, valores_atuais))
+    return divergentes
+
+
+# Diário de auditoria: triggers em lancamentos gravam, na mesma transação da escrita, quem, quando
+# e o lançamento antes/depois de cada inclusão, alteração e exclusão (recálculos de saldo não
+# entram: o saldo é derivado). O diário só aceita inclusões. Fotos periódicas do livro permitem
+# reconstruí-lo em qualquer momento lendo a foto anterior e só o trecho do diário posterior a ela.
+CAMPOS_AUDITADOS = ('data', 'historico', 'complemento', 'entrada', 'saida', 'conta_id')
+
+# Uma nova foto é tirada quando o diário acumula desde a última tantas alterações quanto o livro
+# tem lançamentos (no mínimo FOTO_MINIMO_ALTERACOES): a reconstrução nunca relê mais que um livro
+# de diário e as fotos não ocupam mais espaço que o próprio diário
+FOTO_MINIMO_ALTERACOES = 1000
+
+SQL_DIARIO = '''
+    SELECT id, quando, usuario, operacao, lancamento_id, antes, depois FROM auditoria
+    WHERE (:lancamento IS NULL OR lancamento_id = :lancamento)
+    ORDER BY id DESC LIMIT :limite
+'''
+
+# Lançamentos no momento :ate do diário: a foto :foto mais o último estado de cada lançamento
+# alterado depois dela. O saldo é o acumulado desde o início do livro, como na listagem: os
+# períodos anteriores entram somados e só as linhas do período passam pela janela (ordenação)
+SQL_LIVRO_EM = f'''
+    WITH ultimas AS (
+        SELECT lancamento_id, MAX(id) AS id FROM auditoria
+        WHERE id > :desde AND id <= :ate GROUP BY lancamento_id
+    ), estado AS (
+        SELECT lancamento_id AS id, {', '.join(CAMPOS_AUDITADOS)} FROM auditoria_fotos_lancamentos
+        WHERE foto_id = :foto AND lancamento_id NOT IN (SELECT lancamento_id FROM ultimas)
+        UNION ALL
+        SELECT a.lancamento_id, {', '.join(f"json_extract(a.depois, '$.{campo}')" for campo in CAMPOS_AUDITADOS)}
+        FROM ultimas JOIN auditoria a ON a.id = ultimas.id
+        WHERE a.depois IS NOT NULL
+    ), livro AS (
+        SELECT *, CAST(substr(data, 1, 4) || substr(data, 6, 2) AS INTEGER) AS periodo FROM estado
+    )
+    SELECT livro.id, data, historico, complemento, contas.nome, entrada, saida,
+           (SELECT COALESCE(SUM(entrada - saida), 0) FROM livro WHERE periodo < :periodo)
+           + SUM(entrada - saida) OVER (ORDER BY data, livro.id) AS saldo
+    FROM livro LEFT JOIN contas ON contas.id = livro.conta_id
+    WHERE :periodo IS NULL OR livro.periodo = :periodo
+    ORDER BY data, livro.id
+'''
+
+
+def criar_auditoria(conn):
+    """Cria o diário de auditoria, os triggers que o alimentam e a foto inicial do livro"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS auditoria (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quando TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),  -- UTC
+            usuario TEXT,
+            operacao TEXT NOT NULL CHECK (operacao IN ('inclusao', 'alteracao', 'exclusao')),
+            lancamento_id INTEGER NOT NULL,
+            antes TEXT,   -- JSON dos campos auditados (NULL na inclusão)
+            depois TEXT   -- JSON dos campos auditados (NULL na exclusão)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_auditoria_quando ON auditoria (quando)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_auditoria_lancamento ON auditoria (lancamento_id, id)')
+    for operacao in ('UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS auditoria_somente_inclusao_{operacao.lower()}
+            BEFORE {operacao} ON auditoria BEGIN
+                SELECT RAISE(ABORT, 'o diário de auditoria só aceita inclusões');
+            END
+        ''')
+
+    criar_triggers_auditoria(conn)
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS auditoria_fotos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            auditoria_id INTEGER NOT NULL,  -- última alteração do diário incluída na foto
+            quando TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+            lancamentos INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_auditoria_fotos ON auditoria_fotos (auditoria_id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS auditoria_fotos_lancamentos (
+            foto_id INTEGER NOT NULL REFERENCES auditoria_fotos (id),
+            lancamento_id INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            historico TEXT NOT NULL,
+            complemento TEXT,
+            entrada INTEGER NOT NULL,
+            saida INTEGER NOT NULL,
+            conta_id INTEGER,
+            PRIMARY KEY (foto_id, lancamento_id)
+        ) WITHOUT ROWID
+    ''')
+    if conn.execute('SELECT COUNT(*) FROM auditoria_fotos').fetchone()[0] == 0:
+        # Os lançamentos anteriores ao diário entram na primeira foto
+        registrar_foto(conn)
+
+
+def criar_triggers_auditoria(conn):
+    """(Re)cria os triggers que alimentam o diário. O autor vem de auditoria_autor, e não de uma
+    função registrada pela aplicação: o banco continua gravável pelo sqlite3, DB Browser e scripts
+    (as alterações feitas por eles entram no diário sem usuário)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS auditoria_autor (
+            usuario TEXT  -- autor das escritas da transação em andamento; vazia fora dela
+        )
+    ''')
+
+    def json_campos(linha):
+        return 'json_object(' + ', '.join(f"'{campo}', {linha}.{campo}" for campo in CAMPOS_AUDITADOS) + ')'
+
+    autor = '(SELECT usuario FROM auditoria_autor LIMIT 1)'
+    for nome in ('auditoria_inclusao', 'auditoria_exclusao', 'auditoria_alteracao'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {nome}')
+    conn.execute(f'''
+        CREATE TRIGGER auditoria_inclusao AFTER INSERT ON lancamentos BEGIN
+            INSERT INTO auditoria (usuario, operacao, lancamento_id, depois)
+            VALUES ({autor}, 'inclusao', new.id, {json_campos('new')});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER auditoria_exclusao AFTER DELETE ON lancamentos BEGIN
+            INSERT INTO auditoria (usuario, operacao, lancamento_id, antes)
+            VALUES ({autor}, 'exclusao', old.id, {json_campos('old')});
+        END
+    ''')
+    # Regravar os mesmos valores (a edição em lote envia todas as colunas) não entra no diário
+    conn.execute(f'''
+        CREATE TRIGGER auditoria_alteracao
+        AFTER UPDATE OF {', '.join(CAMPOS_AUDITADOS)} ON lancamentos
+        WHEN {' OR '.join(f'old.{campo} IS NOT new.{campo}' for campo in CAMPOS_AUDITADOS)} BEGIN
+            INSERT INTO auditoria (usuario, operacao, lancamento_id, antes, depois)
+            VALUES ({autor}, 'alteracao', new.id, {json_campos('old')}, {json_campos('new')});
+        END
+    ''')
+
+
+def definir_autor(conn, usuario):
+    """Define o autor das próximas escritas da transação corrente (None: sem autor).
+    Quem define o autor deve limpá-lo antes do commit; como as escritas no banco são serializadas,
+    as outras conexões sempre encontram auditoria_autor vazia."""
+    conn.execute('DELETE FROM auditoria_autor')
+    if usuario is not None:
+        conn.execute('INSERT INTO auditoria_autor (usuario) VALUES (?)', (usuario,))
+
+
+def registrar_foto(conn):
+    """Grava uma foto de todos os lançamentos na transação corrente e retorna o id dela"""
+    ultimo = conn.execute('SELECT COALESCE(MAX(id), 0) FROM auditoria').fetchone()[0]
+    foto_id = conn.execute(
+        'INSERT INTO auditoria_fotos (auditoria_id, lancamentos) VALUES (?, (SELECT COUNT(*) FROM lancamentos)) '
+        'RETURNING id', (ultimo,)).fetchone()[0]
+    conn.execute(f'''
+        INSERT INTO auditoria_fotos_lancamentos (foto_id, lancamento_id, {', '.join(CAMPOS_AUDITADOS)})
+        SELECT ?, id, {', '.join(CAMPOS_AUDITADOS)} FROM lancamentos
+    ''', (foto_id,))
+    return foto_id
+
+
+def foto_pendente(conn):
+    """Indica se o diário já acumulou alterações suficientes para uma nova foto"""
+    return conn.execute('''
+        SELECT (SELECT COALESCE(MAX(id), 0) FROM auditoria) - (SELECT MAX(auditoria_id) FROM auditoria_fotos)
+               >= MAX(?, (SELECT COALESCE(SUM(lancamentos), 0) FROM period_summary))
+    ''', (FOTO_MINIMO_ALTERACOES,)).fetchone()[0] == 1
+
+
+def diario_alteracoes(conn, lancamento_id=None, limite=200):
+    """Alterações mais recentes do diário (de um lançamento, se informado)"""
+    return conn.execute(SQL_DIARIO, {'lancamento': lancamento_id, 'limite': limite}).fetchall()
+
+
+def livro_em(conn, momento, periodo=None):
+    """Lançamentos (id, data, historico, complemento, conta, entrada, saida, saldo) como estavam no
+    momento informado ('AAAA-MM-DD HH:MM:SS' em UTC, ou ISO 8601 com fuso, ex.: '2026-03-01T10:00:00-03:00'),
+    de um período ou do livro inteiro"""
+    try:
+        instante = datetime.fromisoformat(str(momento))
+    except ValueError:
+        raise ValueError(f"momento inválido: '{momento}' (use AAAA-MM-DD HH:MM:SS)")
+    if instante.tzinfo is not None:
+        # O diário guarda UTC: um momento com fuso é convertido antes da comparação
+        instante = instante.astimezone(timezone.utc).replace(tzinfo=None)
+    # Mesmo formato de auditoria.quando, para a comparação como texto
+    momento = instante.strftime('%Y-%m-%d %H:%M:%S.%f')[:23]
+    inicio = conn.execute('SELECT MIN(quando) FROM auditoria_fotos').fetchone()[0]
+    if momento < inicio:
+        raise ValueError(f"o diário de auditoria começa em {inicio[:19]} (UTC)")
+    # Última alteração até o momento (pelo índice de quando, sem varrer o diário)
+    ultima = conn.execute('SELECT id FROM auditoria WHERE quando <= ? ORDER BY quando DESC, id DESC LIMIT 1',
+                          (momento,)).fetchone()
+    ate = ultima[0] if ultima else 0
+    foto_id, desde = conn.execute(
+        'SELECT id, auditoria_id FROM auditoria_fotos WHERE auditoria_id <= ? ORDER BY auditoria_id DESC, id DESC LIMIT 1',
+        (ate,)).fetchone()
+    return conn.execute(SQL_LIVRO_EM, {'foto': foto_id, 'desde': desde, 'ate': ate, 'periodo': periodo}).fetchall()
+
+
+# Índices e verificação dos planos de consulta
+INDICES = (
+    # Filtro por período + ordenação por (data, id), cobrindo as colunas de valores
+    '''CREATE INDEX IF NOT EXISTS idx_lancamentos_periodo_data
+       ON lancamentos (periodo, data, id, entrada, saida, saldo)''',
+)
+
+# Totais por período e conta: a ordem do índice atende o filtro do ano e o GROUP BY,
+# e as colunas de valores o tornam cobridor (a tabela não é lida)
+INDICE_CONTAS = '''CREATE INDEX IF NOT EXISTS idx_lancamentos_periodo_conta
+                   ON lancamentos (periodo, conta_id, entrada, saida)'''
+
+SQL_RESUMO_CONTAS = '''
+    SELECT resumo.periodo, contas.nome AS conta, resumo.entradas, resumo.saidas, resumo.lancamentos
+    FROM (
+        SELECT periodo, conta_id, SUM(entrada) AS entradas, SUM(saida) AS saidas, COUNT(*) AS lancamentos
+        FROM lancamentos
+        WHERE periodo BETWEEN :ano * 100 + 1 AND :ano * 100 + 12
+        GROUP BY periodo, conta_id
+    ) AS resumo
+    LEFT JOIN contas ON contas.id = resumo.conta_id
+    ORDER BY resumo.periodo, contas.nome
+'''
+
+CONSULTAS_CRITICAS = {
+    'lançamentos do mês': (SQL_LANCAMENTOS_MES, (202601,)),
+    'recálculo de saldos': (SQL_RECALCULAR_SALDOS, {'periodo': 202601, 'data': '', 'id': 0}),
+    'limpeza do mês': (SQL_LIMPAR_MES, (202601,)),
+    'exportação do mês': (SQL_EXPORTAR_MES, (202601,)),
+    'página da listagem': (SQL_PAGINA.format(filtros='periodo = ?'), (202601, '', 0, 50)),
+    'resumo mensal': (SQL_RESUMO_MENSAL, {'ano': 2026}),
+    'resumo por conta': (SQL_RESUMO_CONTAS, {'ano': 2026}),
+}
+
+
+def criar_indices(conn):
+    """Cria os índices das consultas críticas (idempotente)"""
+    for sql in INDICES:
+        conn.execute(sql)
+
+
+def verificar_planos(conn):
+    """Falha se alguma consulta crítica fizer varredura completa da tabela lancamentos"""
+    problemas = []
+    for nome, (sql, params) in CONSULTAS_CRITICAS.items():
+        for _, _, _, detalhe in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params):
+            if detalhe.startswith('SCAN lancamentos'):
+                problemas.append(f'{nome}: {detalhe}')
+    if problemas:
+        raise RuntimeError('Consultas sem índice em lancamentos:\n' + '\n'.join(problemas))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manutenção do banco do Livro Caixa')
+    parser.add_argument('comando', choices=['verificar-resumo', 'reconstruir-resumo'])
+    args = parser.parse_args()
+
+    if args.comando == 'reconstruir-resumo':
+        # Como as demais escritas, passa pelo escritor único
+        from servico import reconstruir_resumo
+
+        reconstruir_resumo()
+        print('Resumo por período reconstruído.')
+        raise SystemExit(0)
+
+    with conexao() as conn:
+        divergencias = verificar_resumo_periodos(conn)
+    for periodo, esperado, atual in divergencias:
+        print(f'{periodo}: esperado {esperado}, encontrado {atual}')
+    print(f'{len(divergencias)} período(s) divergente(s).')
+    raise SystemExit(1 if divergencias else 0)
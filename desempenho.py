@@ -0,0 +1,177 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+# Log opcional das execuções (uma linha JSON por rerun com todos os spans)
+ARQUIVO_LOG = os.environ.get('LIVRO_CAIXA_LOG_DESEMPENHO')
+
+# Quantidade de execuções guardadas por página/span para os percentis
+AMOSTRAS = 500
+
+# Cada rerun do Streamlit roda em uma thread própria: a execução em andamento fica em um
+# thread-local, e o histórico (compartilhado por todas as sessões do processo) em deques
+_local = threading.local()
+_trava = threading.Lock()
+_paginas = defaultdict(lambda: deque(maxlen=AMOSTRAS))  # página -> (duração, consultas, tempo em consultas)
+_spans = defaultdict(lambda: deque(maxlen=AMOSTRAS))  # nome do span -> duração
+
+
+def iniciar_execucao():
+    """Abre a medição de um rerun (chamada no início do script)"""
+    _local.execucao = {
+        'inicio': time.perf_counter(),
+        'pagina': None,
+        'spans': [],
+        'consultas': 0,
+        'tempo_consultas': 0.0,
+        'secao': None,
+    }
+
+
+def _execucao():
+    return getattr(_local, 'execucao', None)
+
+
+def definir_pagina(pagina):
+    """Associa o rerun em andamento a uma página (para os percentis por página)"""
+    execucao = _execucao()
+    if execucao is not None:
+        execucao['pagina'] = pagina
+
+
+def _registrar_span(execucao, nome, inicio, duracao):
+    execucao['spans'].append({'nome': nome, 'inicio_ms': (inicio - execucao['inicio']) * 1000,
+                              'duracao_ms': duracao * 1000})
+
+
+@contextmanager
+def medir(nome):
+    """Mede o bloco como um span do rerun em andamento"""
+    execucao = _execucao()
+    if execucao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registrar_span(execucao, nome, inicio, time.perf_counter() - inicio)
+
+
+def cronometrado(funcao):
+    """Decorador: cada chamada da função vira um span com o nome dela"""
+    @wraps(funcao)
+    def medida(*args, **kwargs):
+        with medir(funcao.__name__):
+            return funcao(*args, **kwargs)
+    return medida
+
+
+def iniciar_secao(nome):
+    """Fecha a seção atual do script e abre outra (spans sequenciais, sem indentar o código)"""
+    execucao = _execucao()
+    if execucao is None:
+        return
+    agora = time.perf_counter()
+    if execucao['secao']:
+        secao, inicio = execucao['secao']
+        _registrar_span(execucao, secao, inicio, agora - inicio)
+    execucao['secao'] = (nome, agora) if nome else None
+
+
+def registrar_span(nome, duracao):
+    """Guarda no histórico um span medido fora de um rerun (ex.: na thread do escritor)"""
+    with _trava:
+        _spans[nome].append(duracao * 1000)
+
+
+def contar_consultas():
+    """Liga na thread atual, fora de um rerun (ex.: o escritor), um contador das consultas SQL.
+    Retorna o contador ({'consultas', 'tempo_consultas'}), acumulado a partir de agora."""
+    _local.contador = {'consultas': 0, 'tempo_consultas': 0.0}
+    return _local.contador
+
+
+def registrar_consulta(duracao, quantidade=1):
+    """Soma consultas SQL (quantidade=0: só o tempo de leitura do resultado) ao rerun em andamento
+    ou ao contador da thread"""
+    execucao = _execucao() or getattr(_local, 'contador', None)
+    if execucao is not None:
+        execucao['consultas'] += quantidade
+        execucao['tempo_consultas'] += duracao
+
+
+def finalizar_execucao():
+    """Fecha a medição do rerun, guarda no histórico e grava o log JSON (se configurado).
+    Reruns interrompidos por st.rerun() não chegam aqui e não entram nas estatísticas."""
+    execucao = _execucao()
+    if execucao is None:
+        return None
+    iniciar_secao(None)
+    _local.execucao = None
+
+    duracao = time.perf_counter() - execucao['inicio']
+    pagina = execucao['pagina'] or 'Login'
+    registro = {
+        'momento': datetime.now().isoformat(timespec='seconds'),
+        'pagina': pagina,
+        'duracao_ms': duracao * 1000,
+        'consultas': execucao['consultas'],
+        'tempo_consultas_ms': execucao['tempo_consultas'] * 1000,
+        'spans': execucao['spans'],
+    }
+    with _trava:
+        _paginas[pagina].append((registro['duracao_ms'], registro['consultas'], registro['tempo_consultas_ms']))
+        for span in execucao['spans']:
+            _spans[span['nome']].append(span['duracao_ms'])
+        if ARQUIVO_LOG:
+            with open(ARQUIVO_LOG, 'a', encoding='utf-8') as log:
+                log.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    return registro
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) pelo método do vizinho mais próximo"""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def resumo_paginas():
+    """p50/p95 do tempo de rerun e das consultas de cada página"""
+    with _trava:
+        amostras = {pagina: list(valores) for pagina, valores in _paginas.items()}
+    return [
+        {
+            'Página': pagina,
+            'Execuções': len(valores),
+            'p50 (ms)': percentil([v[0] for v in valores], 50),
+            'p95 (ms)': percentil([v[0] for v in valores], 95),
+            'Consultas p50': percentil([v[1] for v in valores], 50),
+            'SQL p95 (ms)': percentil([v[2] for v in valores], 95),
+        }
+        for pagina, valores in sorted(amostras.items())
+    ]
+
+
+def resumo_spans():
+    """p50/p95 de cada span (funções de dados e seções das páginas), do mais lento ao mais rápido"""
+    with _trava:
+        amostras = {nome: list(valores) for nome, valores in _spans.items()}
+    linhas = [
+        {
+            'Span': nome,
+            'Chamadas': len(valores),
+            'p50 (ms)': percentil(valores, 50),
+            'p95 (ms)': percentil(valores, 95),
+        }
+        for nome, valores in amostras.items()
+    ]
+    return sorted(linhas, key=lambda linha: linha['p95 (ms)'], reverse=True)
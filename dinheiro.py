@@ -0,0 +1,31 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Valores monetários são guardados e somados em centavos inteiros (int/INTEGER/int64);
+# a conversão para reais acontece só na exibição e na exportação
+CENTAVOS_POR_REAL = 100
+
+
+def centavos(valor):
+    """Converte um valor em reais (número ou texto 1234.56) para centavos inteiros"""
+    if valor is None or valor == '':
+        return 0
+    try:
+        # str() preserva o valor digitado (0.1 vira '0.1', e não a aproximação binária)
+        quantia = Decimal(str(valor))
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: '{valor}'")
+    if not quantia.is_finite():
+        raise ValueError(f"valor inválido: '{valor}'")
+    return int((quantia * CENTAVOS_POR_REAL).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def reais(valor_centavos):
+    """Converte centavos para reais (float), para exibição, gráficos e edição na tela"""
+    return valor_centavos / CENTAVOS_POR_REAL
+
+
+def formatar_reais(valor_centavos):
+    """Formata centavos como 'R$ 1,234.56' sem passar por ponto flutuante"""
+    inteiro, resto = divmod(abs(int(valor_centavos)), CENTAVOS_POR_REAL)
+    sinal = '-' if valor_centavos < 0 else ''
+    return f"R$ {sinal}{inteiro:,}.{resto:02d}"
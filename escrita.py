@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+
+from database import transacao, recalculo_agrupado, definir_autor, foto_pendente, registrar_foto
+from desempenho import registrar_span, registrar_consulta, contar_consultas
+
+# Escritor único: as escritas da aplicação entram em uma fila e uma thread as grava em grupo.
+# Cada grupo é uma única transação (um commit e um fsync para vários pedidos) e os saldos de
+# cada período afetado são recalculados uma vez no fim do grupo. Com vários usuários gravando
+# ao mesmo tempo, os pedidos se acumulam enquanto o grupo anterior é gravado e o grupo seguinte
+# fica maior, em vez de cada sessão disputar o lock do banco.
+# Cada pedido leva o usuário da sessão que o fez, gravado pelo diário de auditoria, e devolve
+# as consultas SQL feitas para ele, somadas ao rerun que o enfileirou (página Desempenho).
+
+LOTE_MAXIMO = 100  # pedidos por grupo (limita a espera de quem chegou primeiro)
+
+_fila = queue.Queue()
+_local = threading.local()  # usuário da sessão atendida pela thread
+_trava = threading.Lock()
+_escritor = None
+_estatisticas = {'grupos': 0, 'pedidos': 0}
+
+
+class _Pedido:
+    """Operação de escrita aguardando o commit do grupo"""
+
+    __slots__ = ('operacao', 'args', 'usuario', 'pronto', 'resultado', 'erro', 'consultas', 'tempo_consultas')
+
+    def __init__(self, operacao, args, usuario):
+        self.operacao = operacao
+        self.args = args
+        self.usuario = usuario
+        self.pronto = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.consultas = 0
+        self.tempo_consultas = 0.0
+
+
+def executar(operacao, *args):
+    """Enfileira operacao(conn, *args) para o escritor e espera o commit do grupo.
+    Retorna o resultado da operação ou levanta o erro dela (ou o do commit do grupo)."""
+    if threading.current_thread() is _escritor:
+        # Operação chamada de dentro de outra: já está na transação do grupo
+        raise RuntimeError("escrita enfileirada de dentro do escritor")
+    _iniciar_escritor()
+    pedido = _Pedido(operacao, args, getattr(_local, 'usuario', None))
+    _fila.put(pedido)
+    pedido.pronto.wait()
+    registrar_consulta(pedido.tempo_consultas, pedido.consultas)
+    if pedido.erro is not None:
+        raise pedido.erro
+    return pedido.resultado
+
+
+def definir_usuario(username):
+    """Define o autor das escritas feitas pela thread atual (sessão web ou requisição da API)"""
+    _local.usuario = username
+
+
+def estatisticas():
+    """Grupos gravados e pedidos atendidos desde o início do processo"""
+    return dict(_estatisticas)
+
+
+def _iniciar_escritor():
+    global _escritor
+    if _escritor is not None:
+        return
+    with _trava:
+        if _escritor is None:
+            _escritor = threading.Thread(target=_escrever, name='livro-caixa-escritor', daemon=True)
+            _escritor.start()
+
+
+def _escrever():
+    contador = contar_consultas()
+    while True:
+        # Bloqueia até o primeiro pedido e leva junto os que já estão na fila
+        lote = [_fila.get()]
+        while len(lote) < LOTE_MAXIMO:
+            try:
+                lote.append(_fila.get_nowait())
+            except queue.Empty:
+                break
+        if _gravar(lote, contador):
+            _fotografar()
+
+
+def _marca(contador):
+    return contador['consultas'], contador['tempo_consultas']
+
+
+def _consultas_desde(contador, marca):
+    """Consultas e tempo em SQL do escritor desde a marca"""
+    return contador['consultas'] - marca[0], contador['tempo_consultas'] - marca[1]
+
+
+def _gravar(lote, contador):
+    """Grava os pedidos em uma transação; o erro de um pedido desfaz só o que ele fez.
+    Retorna True se o diário de auditoria já pede uma nova foto do livro."""
+    pendente = False
+    inicio_grupo = _marca(contador)
+    try:
+        with transacao() as conn:
+            autor = None
+            with recalculo_agrupado(conn):
+                for pedido in lote:
+                    versoes = dict(conn.versoes_alteradas)
+                    if pedido.usuario != autor:
+                        # Fora do savepoint: o autor continua valendo se o pedido for desfeito
+                        autor = pedido.usuario
+                        definir_autor(conn, autor)
+                    inicio_pedido = _marca(contador)
+                    conn.execute('SAVEPOINT pedido')
+                    try:
+                        pedido.resultado = pedido.operacao(conn, *pedido.args)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO pedido')
+                        conn.versoes_alteradas = versoes
+                        pedido.erro = e
+                    conn.execute('RELEASE pedido')
+                    pedido.consultas, pedido.tempo_consultas = _consultas_desde(contador, inicio_pedido)
+            if autor is not None:
+                # O autor não é gravado: no commit a tabela volta vazia (em caso de erro, o rollback a limpa)
+                definir_autor(conn, None)
+            pendente = foto_pendente(conn)
+    except Exception as e:
+        # Falhou o grupo (recálculo ou commit): nada foi gravado
+        for pedido in lote:
+            if pedido.erro is None:
+                pedido.resultado, pedido.erro = None, e
+    finally:
+        _estatisticas['grupos'] += 1
+        _estatisticas['pedidos'] += len(lote)
+        # As consultas comuns ao grupo (BEGIN, recálculo dos saldos) entram na conta de cada pedido
+        consultas, tempo = _consultas_desde(contador, inicio_grupo)
+        consultas -= sum(pedido.consultas for pedido in lote)
+        tempo -= sum(pedido.tempo_consultas for pedido in lote)
+        for pedido in lote:
+            pedido.consultas += consultas
+            pedido.tempo_consultas += tempo
+        # Sessões esperando em executar() seguem com o resultado (ou o erro) do seu pedido
+        for pedido in lote:
+            pedido.pronto.set()
+    return pendente
+
+
+def _fotografar():
+    """Foto periódica do livro, depois de liberar as sessões do grupo (medida na página Desempenho)"""
+    inicio = time.perf_counter()
+    span = 'foto do livro'
+    try:
+        with transacao() as conn:
+            # Outro processo pode ter tirado a foto nesse meio-tempo
+            if foto_pendente(conn):
+                registrar_foto(conn)
+    except Exception:
+        # O escritor segue atendendo: o diário continua íntegro e a foto é tentada de novo
+        # depois do próximo grupo
+        span = 'foto do livro (falha)'
+    registrar_span(span, time.perf_counter() - inicio)
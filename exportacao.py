@@ -0,0 +1,74 @@
+import csv
+import io
+import tempfile
+import zipfile
+from datetime import datetime
+
+from database import MESES, SQL_EXPORTAR_MES, periodo_de
+
+TAMANHO_LOTE_EXPORTACAO = 1000  # linhas lidas do cursor por vez
+
+CABECALHO_LANCAMENTOS = ['Data', 'Histórico', 'Complemento', 'Conta', 'Entrada_R$', 'Saída_R$', 'Saldo_R$']
+
+
+def escrever_csv(destino, cabecalho, lotes):
+    """Grava um CSV (separado por ponto e vírgula) em um arquivo binário, lote a lote"""
+    texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+    writer = csv.writer(texto, delimiter=';', lineterminator='\n')
+    writer.writerow(cabecalho)
+    for lote in lotes:
+        writer.writerows(lote)
+    # Solta o arquivo de destino sem fechá-lo
+    texto.flush()
+    texto.detach()
+
+
+def _escrever_csv_zip(zipf, nome_arquivo, cabecalho, lotes):
+    """Grava um CSV diretamente em uma entrada do ZIP"""
+    with zipf.open(nome_arquivo, 'w') as destino:
+        escrever_csv(destino, cabecalho, lotes)
+
+
+def _lotes_cursor(cursor, primeiro_lote):
+    """Percorre o cursor em lotes, começando por um lote já lido"""
+    lote = primeiro_lote
+    while lote:
+        yield lote
+        lote = cursor.fetchmany(TAMANHO_LOTE_EXPORTACAO)
+
+
+def csv_periodo(conn, periodo):
+    """Gera o CSV dos lançamentos de um período (bytes)"""
+    output = io.BytesIO()
+    cursor = conn.execute(SQL_EXPORTAR_MES, (periodo,))
+    escrever_csv(output, CABECALHO_LANCAMENTOS, _lotes_cursor(cursor, cursor.fetchmany(TAMANHO_LOTE_EXPORTACAO)))
+    return output.getvalue()
+
+
+def zip_ano(conn, ano, contas, progresso=None):
+    """Gera o ZIP do ano (informações, contas e um CSV por mês com lançamentos)"""
+    # O ZIP é gerado em um arquivo temporário (em memória só enquanto for pequeno)
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        # Informações do sistema
+        _escrever_csv_zip(zipf, '00_Informacoes.csv',
+                          ['Sistema', 'Ano', 'Exportado_em', 'Desenvolvido_por'],
+                          [[['Livro Caixa - CONSTITUCIONALISTAS-929', ano,
+                             datetime.now().strftime('%d/%m/%Y %H:%M:%S'), 'Silmar Tolotto']]])
+
+        # Contas
+        _escrever_csv_zip(zipf, '01_Contas.csv', ['Conta'], [[[conta] for conta in contas]])
+
+        # Lançamentos por mês, lidos do cursor em lotes
+        for i, mes in enumerate(MESES, 1):
+            if progresso:
+                progresso(i / len(MESES), f"Exportando {mes}/{ano}...")
+            cursor = conn.execute(SQL_EXPORTAR_MES, (periodo_de(ano, mes),))
+            primeiro_lote = cursor.fetchmany(TAMANHO_LOTE_EXPORTACAO)
+            if primeiro_lote:
+                _escrever_csv_zip(zipf, f'02_{mes}.csv', CABECALHO_LANCAMENTOS,
+                                  _lotes_cursor(cursor, primeiro_lote))
+
+    output.seek(0)
+    return output
@@ -0,0 +1,196 @@
+import csv
+import io
+import os
+import re
+import unicodedata
+from datetime import date, datetime
+
+from dinheiro import centavos
+
+# Nomes de colunas aceitos (já normalizados) para cada campo do lançamento.
+# O layout gerado por download_csv_mes (Data;Histórico;Complemento;Conta;Entrada_R$;Saída_R$;Saldo_R$)
+# é reconhecido diretamente; o saldo é sempre recalculado e por isso ignorado.
+COLUNAS = {
+    'data': 'data',
+    'historico': 'historico',
+    'descricao': 'historico',
+    'memo': 'historico',
+    'complemento': 'complemento',
+    'conta': 'conta',
+    'entrada': 'entrada',
+    'credito': 'entrada',
+    'saida': 'saida',
+    'debito': 'saida',
+    'valor': 'valor',
+}
+
+# Datas aceitas (a última é a usada pelos extratos OFX)
+FORMATOS_DATA = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%y', '%Y%m%d')
+
+
+def _normalizar_coluna(nome):
+    """Normaliza o nome de uma coluna (sem acentos, minúsculo e sem sufixo R$)"""
+    texto = unicodedata.normalize('NFKD', str(nome or '')).encode('ascii', 'ignore').decode()
+    texto = texto.lower().replace('(r$)', '').replace('r$', '').strip(' _')
+    return texto
+
+
+def _valor(bruto, numero):
+    """Converte um valor monetário (1.234,56 / 1234.56 / R$ 10,00) para centavos"""
+    if bruto is None or bruto == '':
+        return 0
+    if isinstance(bruto, (int, float)):
+        return centavos(bruto)
+    texto = str(bruto).replace('R$', '').replace(' ', '').strip()
+    if not texto:
+        return 0
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return centavos(texto)
+    except ValueError:
+        raise ValueError(f"Linha {numero}: valor inválido '{bruto}'")
+
+
+def _data(bruta, numero):
+    """Converte a data para o formato AAAA-MM-DD"""
+    if isinstance(bruta, datetime):
+        return bruta.date().isoformat()
+    if isinstance(bruta, date):
+        return bruta.isoformat()
+    texto = str(bruta or '').strip()
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Linha {numero}: data inválida '{bruta}'")
+
+
+def _registro(numero, campos):
+    """Valida os campos de uma linha e retorna (data, historico, complemento, entrada, saida, conta),
+    com os valores em centavos e o nome da conta ('' quando não informada)"""
+    historico = str(campos.get('historico') or '').strip()
+    if not historico:
+        raise ValueError(f"Linha {numero}: histórico vazio")
+    complemento = str(campos.get('complemento') or '').strip()
+    conta = str(campos.get('conta') or '').strip()
+
+    if 'valor' in campos and 'entrada' not in campos and 'saida' not in campos:
+        # Valor com sinal: positivo é entrada, negativo é saída
+        valor = _valor(campos['valor'], numero)
+        entrada, saida = (valor, 0) if valor >= 0 else (0, -valor)
+    else:
+        entrada = _valor(campos.get('entrada'), numero)
+        saida = _valor(campos.get('saida'), numero)
+        if entrada < 0 or saida < 0:
+            raise ValueError(f"Linha {numero}: entrada e saída não podem ser negativas")
+
+    return _data(campos.get('data'), numero), historico, complemento, entrada, saida, conta
+
+
+def _mapear_cabecalho(cabecalho):
+    """Associa cada posição do cabeçalho a um campo do lançamento"""
+    mapa = {}
+    for posicao, nome in enumerate(cabecalho):
+        campo = COLUNAS.get(_normalizar_coluna(nome))
+        if campo and campo not in mapa.values():
+            mapa[posicao] = campo
+    campos = set(mapa.values())
+    if 'data' not in campos or 'historico' not in campos or not campos & {'entrada', 'saida', 'valor'}:
+        raise ValueError("Cabeçalho inválido: são necessárias as colunas Data, Histórico e Entrada/Saída (ou Valor)")
+    return mapa
+
+
+def _registros_tabela(linhas):
+    """Converte linhas de uma planilha (cabeçalho na primeira linha) em registros"""
+    mapa = None
+    for numero, linha in enumerate(linhas, 1):
+        if mapa is None:
+            mapa = _mapear_cabecalho(linha)
+            continue
+        if not any(celula not in (None, '') for celula in linha):
+            continue  # linha em branco
+        campos = {campo: linha[posicao] for posicao, campo in mapa.items() if posicao < len(linha)}
+        yield _registro(numero, campos)
+
+
+def ler_csv(arquivo):
+    """Lê um CSV separado por ponto e vírgula (ou vírgula) linha a linha"""
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    try:
+        primeira_linha = texto.readline()
+        delimitador = ';' if primeira_linha.count(';') >= primeira_linha.count(',') else ','
+        texto.seek(0)
+        yield from _registros_tabela(csv.reader(texto, delimiter=delimitador))
+    finally:
+        # Não fecha o arquivo enviado pelo usuário
+        texto.detach()
+
+
+def ler_xlsx(arquivo):
+    """Lê a primeira planilha de um arquivo XLSX em modo somente leitura (linha a linha)"""
+    from openpyxl import load_workbook
+
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from _registros_tabela(planilha.worksheets[0].iter_rows(values_only=True))
+    finally:
+        planilha.close()
+
+
+def _tags_ofx(texto, tamanho_bloco=65536):
+    """Percorre as tags de um OFX (SGML ou XML) lendo o arquivo em blocos"""
+    resto = ''
+    for bloco in iter(lambda: texto.read(tamanho_bloco), ''):
+        partes = (resto + bloco).split('<')
+        resto = partes.pop()
+        for parte in partes:
+            if parte:
+                tag, _, valor = parte.partition('>')
+                yield tag.strip().upper(), valor.strip()
+    if resto:
+        tag, _, valor = resto.partition('>')
+        yield tag.strip().upper(), valor.strip()
+
+
+def ler_ofx(arquivo):
+    """Lê as transações (STMTTRN) de um extrato bancário OFX"""
+    inicio = arquivo.read(1024)
+    arquivo.seek(0)
+    encoding = 'cp1252' if re.search(rb'CHARSET:\s*1252', inicio) else 'utf-8'
+    texto = io.TextIOWrapper(arquivo, encoding=encoding, errors='replace')
+    try:
+        transacao, numero = None, 0
+        for tag, valor in _tags_ofx(texto):
+            if tag == 'STMTTRN':
+                transacao = {}
+                numero += 1
+            elif tag == '/STMTTRN' and transacao is not None:
+                nome, memo = transacao.get('NAME', ''), transacao.get('MEMO', '')
+                yield _registro(f'{numero} (transação)', {
+                    'data': transacao.get('DTPOSTED', '')[:8],
+                    'historico': memo or nome,
+                    'complemento': nome if memo and nome != memo else '',
+                    'valor': transacao.get('TRNAMT'),
+                })
+                transacao = None
+            elif transacao is not None and not tag.startswith('/'):
+                transacao[tag] = valor
+    finally:
+        texto.detach()
+
+
+LEITORES = {
+    '.csv': ler_csv,
+    '.ofx': ler_ofx,
+    '.xlsx': ler_xlsx,
+}
+
+
+def ler_arquivo(arquivo, nome_arquivo):
+    """Retorna os registros validados de um arquivo CSV, OFX ou XLSX"""
+    extensao = os.path.splitext(nome_arquivo)[1].lower()
+    if extensao not in LEITORES:
+        raise ValueError(f"Formato não suportado: {extensao or nome_arquivo}")
+    return LEITORES[extensao](arquivo)
@@ -1,12 +1,29 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timezone
+import html
 import io
-import sqlite3
-import base64
+import json
 import os
-import zipfile
-import hashlib
+from PIL import Image
+
+import servico
+from auth import VALIDADE_SESSAO
+from escrita import definir_usuario
+from migracoes import garantir_schema
+from desempenho import (iniciar_execucao, finalizar_execucao, definir_pagina, iniciar_secao, cronometrado,
+                        resumo_paginas, resumo_spans, ARQUIVO_LOG)
+from importacao import ler_arquivo
+from dinheiro import centavos, reais, formatar_reais
+from servico import PERMISSOES
+from database import (conexao, versao_dados,
+                      MESES, periodo_de, periodo_da_data, nome_mes, COLUNAS_LISTAGEM,
+                      SQL_TOTAIS_GERAIS, verificar_resumo_periodos,
+                      SQL_LANCAMENTOS_MES, SQL_RESUMO_MENSAL, SQL_RESUMO_CONTAS, SQL_ANOS)
+
+# Medição do rerun: spans das funções de dados e das seções do script
+iniciar_execucao()
+iniciar_secao('configuração da página')
 
 # Configuração da página para melhor responsividade
 st.set_page_config(
@@ -26,6 +43,9 @@ st.markdown("""
     .stDataFrame {
         font-size: 0.9rem;
     }
+    [data-testid="stSidebar"] [data-testid="stImage"] img {
+        border-radius: 10px;
+    }
     @media (max-width: 768px) {
         .stDataFrame {
             font-size: 0.8rem;
@@ -34,142 +54,107 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# CONSTANTES PARA PERMISSÕES
-PERMISSOES = {
-    'admin': 'Administrador',
-    'editor': 'Editor', 
-    'visualizador': 'Apenas Visualização'
-}
-
-# Funções de autenticação MODIFICADAS
-def init_auth_db():
-    """Inicializa a tabela de usuários com permissões"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            permissao TEXT NOT NULL DEFAULT 'visualizador',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Inserir usuários padrão se não existirem
-    c.execute('SELECT COUNT(*) FROM usuarios WHERE username = ?', ('admin',))
-    if c.fetchone()[0] == 0:
-        # Senha padrão: "admin123"
-        password_hash = hashlib.sha256('admin123'.encode()).hexdigest()
-        c.execute('INSERT INTO usuarios (username, password_hash, permissao) VALUES (?, ?, ?)', 
-                 ('admin', password_hash, 'admin'))
-        
-        # Usuário visualizador padrão
-        password_hash_viewer = hashlib.sha256('visual123'.encode()).hexdigest()
-        c.execute('INSERT INTO usuarios (username, password_hash, permissao) VALUES (?, ?, ?)', 
-                 ('visual', password_hash_viewer, 'visualizador'))
-    
-    conn.commit()
-    conn.close()
+# Funções de autenticação (as regras ficam em servico; aqui só a sessão do Streamlit)
+COOKIE_SESSAO = 'livro_caixa_sessao'
+
+def gravar_cookie_sessao():
+    """Grava (ou apaga, se vazio) no navegador o cookie de sessão pendente desta sessão"""
+    token = st.session_state.pop('cookie_sessao', None)
+    if token is None:
+        return
+    # O Streamlit não envia cabeçalhos Set-Cookie: o cookie é gravado por script na página.
+    # SameSite=Strict não o envia em navegação vinda de outros sites; Secure quando em HTTPS.
+    validade = VALIDADE_SESSAO if token else 0
+    st.html(f"""<script>
+        document.cookie = {json.dumps(f'{COOKIE_SESSAO}={token}')} + '; path=/; max-age={validade}; SameSite=Strict'
+            + (location.protocol === 'https:' ? '; Secure' : '');
+    </script>""", unsafe_allow_javascript=True)
 
-def verify_password(password, password_hash):
-    """Verifica se a senha está correta"""
-    return hashlib.sha256(password.encode()).hexdigest() == password_hash
+def iniciar_sessao(username, permissao, password_hash):
+    """Marca a sessão como logada e emite o token que permite reconectar sem nova senha"""
+    st.session_state.logged_in = True
+    st.session_state.username = username
+    st.session_state.permissao = permissao  # Salvar a permissão na sessão
+    
+    # O token vai para um cookie (e não para a URL, que vaza pelo histórico, links e logs):
+    # recarregar a página ou reconectar o navegador mantém o login
+    st.session_state.cookie_sessao = servico.emitir_token(username, password_hash)
 
+@cronometrado
 def login_user(username, password):
     """Faz login do usuário"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    c.execute('SELECT password_hash, permissao FROM usuarios WHERE username = ?', (username,))
-    result = c.fetchone()
-    conn.close()
-    
-    if result and verify_password(password, result[0]):
-        st.session_state.logged_in = True
-        st.session_state.username = username
-        st.session_state.permissao = result[1]  # Salvar a permissão na sessão
+    autenticado = servico.autenticar(username, password)
+    if autenticado:
+        iniciar_sessao(username, *autenticado)
         return True
     return False
 
+@cronometrado
+def restaurar_sessao():
+    """Restaura o login a partir do cookie de sessão, sem recalcular o hash da senha"""
+    # Links antigos ainda podem trazer o token na URL: ele é descartado, não aceito
+    st.query_params.pop('sessao', None)
+    token = st.context.cookies.get(COOKIE_SESSAO)
+    if not token:
+        return False
+    usuario = servico.usuario_da_sessao(token)
+    
+    # Token expirado, adulterado ou emitido antes de uma troca de senha
+    if not usuario:
+        st.session_state.cookie_sessao = ''
+        return False
+    st.session_state.logged_in = True
+    st.session_state.username, st.session_state.permissao = usuario
+    return True
+
 def logout_user():
     """Faz logout do usuário"""
     st.session_state.logged_in = False
     st.session_state.username = None
     st.session_state.permissao = None
+    st.session_state.cookie_sessao = ''
 
 def change_password(username, new_password):
     """Altera a senha do usuário"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    password_hash = hashlib.sha256(new_password.encode()).hexdigest()
-    c.execute('UPDATE usuarios SET password_hash = ? WHERE username = ?', 
-             (password_hash, username))
-    conn.commit()
-    conn.close()
+    password_hash = servico.alterar_senha(username, new_password)
+    # Tokens antigos deixam de valer; a sessão atual recebe um novo
+    if username == st.session_state.get('username'):
+        iniciar_sessao(username, st.session_state.permissao, password_hash)
 
 def create_user(username, password, permissao='visualizador'):
     """Cria um novo usuário"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
-    
     try:
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        c.execute('INSERT INTO usuarios (username, password_hash, permissao) VALUES (?, ?, ?)', 
-                 (username, password_hash, permissao))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False  # Usuário já existe
+        return servico.criar_usuario(username, password, permissao)  # False: usuário já existe
+    except ValueError as e:
+        st.error(f"❌ Nome de usuário inválido: {e}")
+        return None
     except Exception as e:
         return False
-    finally:
-        conn.close()
 
+@cronometrado
 def get_all_users():
     """Busca todos os usuários (apenas para admin)"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    c.execute('SELECT username, permissao, created_at FROM usuarios ORDER BY created_at')
-    users = c.fetchall()
-    conn.close()
-    
-    return users
+    return servico.listar_usuarios()
 
 def update_user_permission(username, permissao):
     """Atualiza a permissão de um usuário"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
-    
     try:
-        c.execute('UPDATE usuarios SET permissao = ? WHERE username = ?', (permissao, username))
-        conn.commit()
+        servico.alterar_permissao(username, permissao)
         return True, "Permissão atualizada com sucesso!"
     except Exception as e:
         return False, f"Erro ao atualizar permissão: {e}"
-    finally:
-        conn.close()
 
 def delete_user(username):
     """Exclui um usuário (apenas para admin)"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
+    # Não permitir excluir o próprio usuário
+    if username == st.session_state.username:
+        return False, "Não é possível excluir seu próprio usuário!"
     
     try:
-        # Não permitir excluir o próprio usuário
-        if username == st.session_state.username:
-            return False, "Não é possível excluir seu próprio usuário!"
-        
-        c.execute('DELETE FROM usuarios WHERE username = ?', (username,))
-        conn.commit()
+        servico.excluir_usuario(username)
         return True, "Usuário excluído com sucesso!"
     except Exception as e:
         return False, f"Erro ao excluir usuário: {e}"
-    finally:
-        conn.close()
 
 # Função para verificar permissões
 def user_can_edit():
@@ -180,25 +165,38 @@ def user_is_admin():
     """Verifica se o usuário é administrador"""
     return st.session_state.get('permissao') == 'admin'
 
+# Arquivos estáticos: lidos uma vez por processo e relidos só quando o arquivo muda
+LARGURA_LOGO = 600  # px: o dobro da largura da sidebar, suficiente para telas de alta densidade
+
+def ler_imagem_estatica(caminho, largura_maxima):
+    """Retorna a imagem em PNG, reduzida à largura máxima (em cache pela data de modificação) ou None"""
+    try:
+        modificado_em = os.path.getmtime(caminho)
+    except OSError:
+        return None
+    return _ler_imagem_estatica(caminho, largura_maxima, modificado_em)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _ler_imagem_estatica(caminho, largura_maxima, modificado_em):
+    """Lê e reduz a imagem uma única vez (compartilhada entre sessões, sem cópia a cada rerun)"""
+    # Imagens mais largas que o limite do st.image seriam redimensionadas e
+    # recodificadas pelo Streamlit a cada rerun; a redução é feita aqui, uma vez
+    imagem = Image.open(caminho)
+    imagem.thumbnail((largura_maxima, largura_maxima * 10))
+    saida = io.BytesIO()
+    imagem.save(saida, format="PNG", optimize=True)
+    return saida.getvalue()
+
 # Função para carregar e exibir a imagem do logo
+@cronometrado
 def carregar_imagem_logo(caminho_imagem="Logo_Loja.png"):
     """Carrega e exibe a imagem do logo na sidebar"""
     try:
-        # Verifica se o arquivo existe
-        if os.path.exists(caminho_imagem):
-            # Lê a imagem e converte para base64
-            with open(caminho_imagem, "rb") as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode()
-            
-            # Exibe a imagem na sidebar
-            st.sidebar.markdown(
-                f"""
-                <div style="text-align: center; padding: 10px; margin-bottom: 20px;">
-                    <img src="data:image/png;base64,{img_base64}" style="max-width: 100%; height: auto; border-radius: 10px;">
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
+        logo = ler_imagem_estatica(caminho_imagem, LARGURA_LOGO)
+        if logo is not None:
+            # st.image publica a imagem como arquivo de mídia com URL própria (que o navegador
+            # guarda em cache), em vez de reenviar o PNG em base64 dentro do HTML a cada rerun
+            st.sidebar.image(logo, use_container_width=True)
             return True
         else:
             # Se a imagem não existe, mostra o texto como fallback
@@ -217,349 +215,297 @@ def carregar_imagem_logo(caminho_imagem="Logo_Loja.png"):
         st.sidebar.error(f"Erro ao carregar logo: {str(e)}")
         return False
 
-# Funções para o banco de dados
-def init_db():
-    """Inicializa o banco de dados SQLite"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    # Tabela para lançamentos
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS lancamentos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mes TEXT NOT NULL,
-            data DATE NOT NULL,
-            historico TEXT NOT NULL,
-            complemento TEXT,
-            entrada REAL DEFAULT 0,
-            saida REAL DEFAULT 0,
-            saldo REAL DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabela SIMPLIFICADA para contas (sem separação Receitas/Despesas)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS contas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Inserir contas padrão se a tabela estiver vazia
-    c.execute('SELECT COUNT(*) FROM contas')
-    if c.fetchone()[0] == 0:
-        contas_padrao = [
-            'Salários',
-            'Aluguel',
-            'Energia Elétrica',
-            'Água',
-            'Telefone',
-            'Internet',
-            'Material de Expediente',
-            'Transporte',
-            'Alimentação',
-            'Manutenção',
-            'Vendas',
-            'Serviços Prestados',
-            'Consultoria',
-            'Outras Receitas',
-            'Outras Despesas'
-        ]
-        for conta in contas_padrao:
-            c.execute('INSERT OR IGNORE INTO contas (nome) VALUES (?)', (conta,))
-    
-    conn.commit()
-    conn.close()
-
-def get_lancamentos_mes(mes):
+# Leituras em cache: a versão dos dados faz parte da chave, então qualquer
+# gravação (neste ou em outro processo) invalida os resultados anteriores
+@cronometrado
+def get_lancamentos_mes(ano, mes):
     """Busca lançamentos de um mês específico"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
     try:
-        df = pd.read_sql(f"SELECT * FROM lancamentos WHERE mes = '{mes}' ORDER BY data, id", conn)
-        # Renomear colunas para maiúsculas para compatibilidade
-        df.columns = [col.upper() for col in df.columns]
+        df = _ler_lancamentos_periodo(periodo_de(ano, mes), versao_dados('lancamentos'))
     except Exception as e:
         st.error(f"Erro ao buscar lançamentos: {e}")
-        df = pd.DataFrame(columns=['ID', 'MES', 'DATA', 'HISTORICO', 'COMPLEMENTO', 'ENTRADA', 'SAIDA', 'SALDO', 'CREATED_AT'])
-    finally:
-        conn.close()
+        df = pd.DataFrame(columns=['ID', 'MES', 'DATA', 'HISTORICO', 'COMPLEMENTO', 'ENTRADA', 'SAIDA', 'SALDO',
+                                   'CREATED_AT', 'PERIODO'])
+    return df
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _ler_lancamentos_periodo(periodo, versao):
+    """Lê os lançamentos de um período (em cache por versão dos dados)"""
+    with conexao() as conn:
+        df = pd.read_sql(SQL_LANCAMENTOS_MES, conn, params=(periodo,))
+    # Renomear colunas para maiúsculas para compatibilidade
+    df.columns = [col.upper() for col in df.columns]
     return df
 
-def salvar_lancamento(mes, data, historico, complemento, entrada, saida, saldo):
+def _tabela_lancamentos(linhas):
+    """DataFrame da listagem (colunas em maiúsculas) a partir das linhas do serviço"""
+    df = pd.DataFrame(linhas, columns=list(COLUNAS_LISTAGEM))
+    df.columns = [col.upper() for col in df.columns]
+    return df
+
+@cronometrado
+def get_pagina_lancamentos(ano, mes, filtros, apos=None, tamanho=50):
+    """Busca uma página de lançamentos do mês com os filtros aplicados no banco"""
+    return _ler_pagina_lancamentos(periodo_de(ano, mes), filtros, apos, tamanho, versao_dados('lancamentos'))
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _ler_pagina_lancamentos(periodo, filtros, apos, tamanho, versao):
+    """Lê uma página da listagem e os totais filtrados (em cache por versão dos dados)"""
+    linhas, tem_proxima, totais = servico.pagina_lancamentos(periodo, filtros, apos, tamanho)
+    return _tabela_lancamentos(linhas), tem_proxima, totais
+
+@cronometrado
+def get_busca_lancamentos(texto, data_inicio=None, data_fim=None):
+    """Busca lançamentos de todos os meses pelo histórico/complemento, por relevância"""
+    try:
+        return _ler_busca_lancamentos(texto, data_inicio, data_fim, versao_dados('lancamentos'))
+    except Exception as e:
+        st.error(f"Erro ao pesquisar lançamentos: {e}")
+        return pd.DataFrame(columns=[col.upper() for col in COLUNAS_LISTAGEM])
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _ler_busca_lancamentos(texto, data_inicio, data_fim, versao):
+    """Lê o resultado de uma busca textual (em cache por versão dos dados)"""
+    return _tabela_lancamentos(servico.pesquisar(texto, data_inicio, data_fim))
+
+@cronometrado
+def get_diario(lancamento_id=None):
+    """Busca as alterações mais recentes do diário de auditoria (de um lançamento, se informado)"""
+    return _ler_diario(lancamento_id, versao_dados('lancamentos'))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _ler_diario(lancamento_id, versao):
+    """Lê o diário de auditoria (em cache por versão dos dados)"""
+    return servico.diario(lancamento_id)
+
+@cronometrado
+def get_livro_no_momento(momento, ano, mes):
+    """Busca os lançamentos do mês como estavam no momento informado (UTC)"""
+    try:
+        return _ler_livro_no_momento(momento, periodo_de(ano, mes), versao_dados('lancamentos'))
+    except ValueError as e:
+        st.warning(f"⚠️ {e}")
+        return pd.DataFrame(columns=[col.upper() for col in COLUNAS_LISTAGEM])
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _ler_livro_no_momento(momento, periodo, versao):
+    """Reconstrói um mês pelo diário de auditoria (em cache por versão dos dados)"""
+    return _tabela_lancamentos(servico.livro_no_momento(momento, periodo))
+
+def descrever_lancamento(campos, nomes_contas):
+    """Resumo legível dos campos auditados de um lançamento (antes/depois no diário)"""
+    if not campos:
+        return ''
+    partes = [campos['data'], campos['historico']]
+    if campos['complemento']:
+        partes.append(campos['complemento'])
+    if campos['conta_id'] is not None:
+        partes.append(nomes_contas.get(campos['conta_id'], f"conta {campos['conta_id']}"))
+    if campos['entrada']:
+        partes.append(f"entrada {formatar_reais(campos['entrada'])}")
+    if campos['saida']:
+        partes.append(f"saída {formatar_reais(campos['saida'])}")
+    return ' · '.join(partes)
+
+@cronometrado
+def get_resumo_mensal(ano):
+    """Busca entradas, saídas, saldo final e quantidade de lançamentos de cada mês do ano"""
+    return _ler_resumo_mensal(int(ano), versao_dados('lancamentos'))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _ler_resumo_mensal(ano, versao):
+    """Lê o resumo mensal de um ano (em cache por versão dos dados)"""
+    with conexao() as conn:
+        return pd.read_sql(SQL_RESUMO_MENSAL, conn, params={'ano': ano})
+
+@cronometrado
+def get_resumo_contas(ano):
+    """Busca entradas, saídas e quantidade de lançamentos por mês e conta do ano"""
+    return _ler_resumo_contas(int(ano), versao_dados('lancamentos'), versao_dados('contas'))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _ler_resumo_contas(ano, versao_lancamentos, versao_contas):
+    """Lê o resumo por mês e conta de um ano (em cache por versão dos dados)"""
+    with conexao() as conn:
+        return pd.read_sql(SQL_RESUMO_CONTAS, conn, params={'ano': ano})
+
+@cronometrado
+def get_anos():
+    """Busca os anos com lançamentos (sempre incluindo o ano atual)"""
+    return _ler_anos(versao_dados('lancamentos'))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _ler_anos(versao):
+    """Lê os anos com lançamentos (em cache por versão dos dados)"""
+    with conexao() as conn:
+        anos = {row[0] for row in conn.execute(SQL_ANOS)}
+    anos.add(datetime.now().year)
+    return sorted(anos, reverse=True)
+
+@cronometrado
+def get_estatisticas():
+    """Busca os totais de lançamentos, contas e meses com dados"""
+    return _ler_estatisticas(versao_dados('lancamentos'), versao_dados('contas'))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _ler_estatisticas(versao_lancamentos, versao_contas):
+    """Lê os totais do sistema (em cache por versão dos dados)"""
+    with conexao() as conn:
+        total_lancamentos, meses_com_dados = conn.execute(SQL_TOTAIS_GERAIS).fetchone()
+        total_contas = conn.execute('SELECT COUNT(*) FROM contas').fetchone()[0]
+    return int(total_lancamentos), total_contas, meses_com_dados
+
+@cronometrado
+def salvar_lancamento(data, historico, complemento, entrada, saida, conta_id=None):
     """Salva um novo lançamento no banco"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
     try:
-        c.execute('''
-            INSERT INTO lancamentos (mes, data, historico, complemento, entrada, saida, saldo)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (mes, data, historico, complemento, entrada, saida, saldo))
-        conn.commit()
+        servico.novo_lancamento(data, historico, complemento, entrada, saida, conta_id)
         st.success("✅ Lançamento adicionado com sucesso!")
     except Exception as e:
         st.error(f"❌ Erro ao salvar lançamento: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
 
-def atualizar_lancamento(lancamento_id, mes, data, historico, complemento, entrada, saida):
+@cronometrado
+def atualizar_lancamento(lancamento_id, data, historico, complemento, entrada, saida, conta_id=None):
     """Atualiza um lançamento existente no banco"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
     try:
-        # Buscar todos os lançamentos do mês para recalcular saldos
-        c.execute('SELECT * FROM lancamentos WHERE mes = ? ORDER BY data, id', (mes,))
-        lancamentos = c.fetchall()
-        
-        # Encontrar o índice do lançamento sendo editado
-        index_editado = None
-        for i, lanc in enumerate(lancamentos):
-            if lanc[0] == lancamento_id:
-                index_editado = i
-                break
-        
-        if index_editado is not None:
-            # Atualizar o lançamento específico
-            c.execute('''
-                UPDATE lancamentos 
-                SET data = ?, historico = ?, complemento = ?, entrada = ?, saida = ?
-                WHERE id = ?
-            ''', (data, historico, complemento, entrada, saida, lancamento_id))
-            
-            # Recalcular todos os saldos a partir do lançamento editado
-            for i in range(index_editado, len(lancamentos)):
-                if i == index_editado:
-                    # Para o lançamento editado, usar saldo anterior
-                    if i == 0:
-                        saldo = entrada - saida
-                    else:
-                        saldo_anterior = lancamentos[i-1][7]  # SALDO do lançamento anterior
-                        saldo = saldo_anterior + entrada - saida
-                else:
-                    # Para lançamentos seguintes, recalcular baseado no anterior
-                    entrada_atual = lancamentos[i][5] if i != index_editado else entrada
-                    saida_atual = lancamentos[i][6] if i != index_editado else saida
-                    saldo_anterior = lancamentos[i-1][7] if i > 0 else 0
-                    saldo = saldo_anterior + entrada_atual - saida_atual
-                
-                # Atualizar saldo no banco
-                lanc_id = lancamentos[i][0] if i != index_editado else lancamento_id
-                c.execute('UPDATE lancamentos SET saldo = ? WHERE id = ?', (saldo, lanc_id))
-            
-            conn.commit()
-            return True
-        else:
+        if not servico.editar_lancamento(lancamento_id, data, historico, complemento, entrada, saida, conta_id):
             st.error("❌ Lançamento não encontrado")
             return False
+        
+        return True
             
     except Exception as e:
         st.error(f"❌ Erro ao atualizar lançamento: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
 
-def excluir_lancamento(lancamento_id, mes):
+@cronometrado
+def excluir_lancamento(lancamento_id):
     """Exclui um lançamento específico"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
     try:
-        # Buscar o lançamento a ser excluído
-        c.execute('SELECT * FROM lancamentos WHERE id = ?', (lancamento_id,))
-        lancamento = c.fetchone()
-        
-        if lancamento:
-            # Excluir o lançamento
-            c.execute('DELETE FROM lancamentos WHERE id = ?', (lancamento_id,))
-            
-            # Recalcular saldos dos lançamentos seguintes
-            c.execute('SELECT * FROM lancamentos WHERE mes = ? ORDER BY data, id', (mes,))
-            lancamentos_restantes = c.fetchall()
-            
-            for i, lanc in enumerate(lancamentos_restantes):
-                if i == 0:
-                    saldo = lanc[5] - lanc[6]  # entrada - saida
-                else:
-                    saldo_anterior = lancamentos_restantes[i-1][7]
-                    saldo = saldo_anterior + lanc[5] - lanc[6]
-                
-                c.execute('UPDATE lancamentos SET saldo = ? WHERE id = ?', (saldo, lanc[0]))
-            
-            conn.commit()
-            return True
-        else:
+        if not servico.excluir_lancamento(lancamento_id):
             st.error("❌ Lançamento não encontrado")
             return False
+        
+        return True
             
     except Exception as e:
         st.error(f"❌ Erro ao excluir lançamento: {e}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
 
-def limpar_lancamentos_mes(mes):
+@cronometrado
+def aplicar_lancamentos_em_lote(alterados, excluidos):
+    """Atualiza e exclui vários lançamentos em uma única transação, recalculando cada período uma vez"""
+    try:
+        servico.aplicar_lote(alterados, excluidos)
+        return True
+    except Exception as e:
+        st.error(f"❌ Erro ao aplicar alterações: {e}")
+        return False
+
+def lancamentos_alterados(original, editado, contas):
+    """Compara a tabela do editor com a original e retorna (alterados, excluidos)"""
+    colunas = ['DATA', 'HISTORICO', 'COMPLEMENTO', 'ENTRADA', 'SAIDA', 'CONTA']
+    excluir = editado['EXCLUIR'].fillna(False).astype(bool)
+    excluidos = [int(lancamento_id) for lancamento_id in editado.loc[excluir, 'ID']]
+    
+    # Célula de valor apagada no editor chega como NaN (verdadeiro em `or`): vale zero
+    valores = {'ENTRADA': 0, 'SAIDA': 0}
+    depois = editado.loc[~excluir].set_index('ID')[colunas].fillna(valores)
+    antes = original.set_index('ID').loc[depois.index, colunas].fillna(valores)
+    mudou = (antes.fillna('') != depois.fillna('')).any(axis=1)
+    
+    # O editor trabalha em reais e com o nome da conta; o banco, em centavos e com o id da conta
+    alterados = [
+        (int(lancamento_id), data, historico, complemento or '', centavos(entrada), centavos(saida),
+         contas.get(conta))
+        for lancamento_id, data, historico, complemento, entrada, saida, conta in depois[mudou].itertuples()
+    ]
+    return alterados, excluidos
+
+@cronometrado
+def limpar_lancamentos_mes(ano, mes):
     """Remove todos os lançamentos de um mês"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
     try:
-        c.execute('DELETE FROM lancamentos WHERE mes = ?', (mes,))
-        conn.commit()
-        st.success(f"✅ Lançamentos de {mes} removidos com sucesso!")
+        servico.limpar_periodo(periodo_de(ano, mes))
+        st.success(f"✅ Lançamentos de {mes}/{ano} removidos com sucesso!")
     except Exception as e:
         st.error(f"❌ Erro ao limpar lançamentos: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
 
+@cronometrado
+def importar_lancamentos(arquivo, nome_arquivo):
+    """Importa lançamentos em lote (CSV, OFX ou XLSX) em uma única transação"""
+    try:
+        total = servico.importar_lancamentos(ler_arquivo(arquivo, nome_arquivo))
+        st.success(f"✅ {total} lançamentos importados com sucesso!")
+        return total
+    except ValueError as e:
+        st.error(f"❌ Arquivo inválido: {e}")
+    except Exception as e:
+        st.error(f"❌ Erro ao importar lançamentos: {e}")
+    return 0
+
+@cronometrado
 def get_contas():
-    """Busca todas as contas"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
+    """Busca todas as contas (nome -> id, em ordem alfabética)"""
     try:
-        df = pd.read_sql("SELECT nome FROM contas ORDER BY nome", conn)
-        contas = df['nome'].tolist()
+        contas = _ler_contas(versao_dados('contas'))
     except Exception as e:
         st.error(f"Erro ao buscar contas: {e}")
-        contas = []
-    finally:
-        conn.close()
+        contas = {}
     return contas
 
+@st.cache_data(show_spinner=False, max_entries=4)
+def _ler_contas(versao):
+    """Lê as contas (em cache por versão dos dados)"""
+    return servico.listar_contas()
+
+@cronometrado
 def adicionar_conta(nome_conta):
     """Adiciona uma nova conta"""
-    conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-    c = conn.cursor()
     try:
-        c.execute('INSERT OR IGNORE INTO contas (nome) VALUES (?)', (nome_conta,))
-        conn.commit()
+        servico.adicionar_conta(nome_conta)
         st.success(f"✅ Conta '{nome_conta}' adicionada com sucesso!")
     except Exception as e:
         st.error(f"❌ Erro ao adicionar conta: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
 
 # Função para exportar dados em formato CSV
-def exportar_para_csv():
-    """Exporta dados para formato CSV que pode ser aberto no Excel"""
+@cronometrado
+def exportar_para_csv(ano, progresso=None):
+    """Exporta dados de um ano para formato CSV que pode ser aberto no Excel"""
     try:
-        # Criar um arquivo ZIP em memória com múltiplos CSVs
-        output = io.BytesIO()
-        
-        # Criar estrutura de dados para exportação
-        dados_exportacao = {}
-        
-        # Informações do sistema
-        dados_exportacao['00_Informacoes.csv'] = pd.DataFrame({
-            'Sistema': ['Livro Caixa - CONSTITUCIONALISTAS-929'],
-            'Exportado_em': [datetime.now().strftime('%d/%m/%Y %H:%M:%S')],
-            'Desenvolvido_por': ['Silmar Tolotto']
-        })
-        
-        # Contas
-        contas = get_contas()
-        dados_exportacao['01_Contas.csv'] = pd.DataFrame({'Conta': contas})
-        
-        # Lançamentos por mês
-        meses = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
-                "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
-        
-        for mes in meses:
-            df_mes = get_lancamentos_mes(mes)
-            if not df_mes.empty:
-                # Selecionar e renomear colunas
-                colunas_exportar = []
-                mapeamento_colunas = {}
-                
-                if 'DATA' in df_mes.columns:
-                    colunas_exportar.append('DATA')
-                    mapeamento_colunas['DATA'] = 'Data'
-                if 'HISTORICO' in df_mes.columns:
-                    colunas_exportar.append('HISTORICO')
-                    mapeamento_colunas['HISTORICO'] = 'Histórico'
-                if 'COMPLEMENTO' in df_mes.columns:
-                    colunas_exportar.append('COMPLEMENTO')
-                    mapeamento_colunas['COMPLEMENTO'] = 'Complemento'
-                if 'ENTRADA' in df_mes.columns:
-                    colunas_exportar.append('ENTRADA')
-                    mapeamento_colunas['ENTRADA'] = 'Entrada_R$'
-                if 'SAIDA' in df_mes.columns:
-                    colunas_exportar.append('SAIDA')
-                    mapeamento_colunas['SAIDA'] = 'Saída_R$'
-                if 'SALDO' in df_mes.columns:
-                    colunas_exportar.append('SALDO')
-                    mapeamento_colunas['SALDO'] = 'Saldo_R$'
-                
-                if colunas_exportar:
-                    df_export = df_mes[colunas_exportar].copy()
-                    df_export.columns = [mapeamento_colunas[col] for col in colunas_exportar]
-                    
-                    # Formatar datas
-                    if 'Data' in df_export.columns:
-                        df_export['Data'] = pd.to_datetime(df_export['Data']).dt.strftime('%d/%m/%Y')
-                    
-                    dados_exportacao[f'02_{mes}.csv'] = df_export
-        
-        # Criar um arquivo ZIP com todos os CSVs
-        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for nome_arquivo, df in dados_exportacao.items():
-                # CORREÇÃO: usar ponto e vírgula como delimitador
-                csv_data = df.to_csv(index=False, sep=';', encoding='utf-8-sig')
-                zipf.writestr(nome_arquivo, csv_data)
-        
-        output.seek(0)
-        return output
-        
+        return servico.exportar_ano(ano, progresso)
     except Exception as e:
         st.error(f"❌ Erro ao exportar dados: {e}")
         return None
 
 # Função para download CSV individual por mês
-def download_csv_mes(mes):
-    """Gera CSV individual para um mês específico"""
-    df_mes = get_lancamentos_mes(mes)
-    if not df_mes.empty:
-        # Selecionar colunas para exportação
-        colunas_exportar = ['DATA', 'HISTORICO', 'COMPLEMENTO', 'ENTRADA', 'SAIDA', 'SALDO']
-        colunas_existentes = [col for col in colunas_exportar if col in df_mes.columns]
-        
-        if colunas_existentes:
-            df_export = df_mes[colunas_existentes].copy()
-            
-            # Renomear colunas
-            mapeamento_colunas = {
-                'DATA': 'Data',
-                'HISTORICO': 'Histórico',
-                'COMPLEMENTO': 'Complemento',
-                'ENTRADA': 'Entrada_R$',
-                'SAIDA': 'Saída_R$',
-                'SALDO': 'Saldo_R$'
-            }
-            df_export.columns = [mapeamento_colunas[col] for col in colunas_existentes]
-            
-            # Formatar datas
-            if 'Data' in df_export.columns:
-                df_export['Data'] = pd.to_datetime(df_export['Data']).dt.strftime('%d/%m/%Y')
-            
-            # Converter para CSV com ponto e vírgula
-            csv_data = df_export.to_csv(index=False, sep=';', encoding='utf-8-sig')
-            return csv_data
-    return None
+@cronometrado
+def download_csv_mes(ano, mes):
+    """Gera CSV individual para um mês específico (chamada só quando o download é solicitado)"""
+    return _gerar_csv_periodo(periodo_de(ano, mes), versao_dados('lancamentos'))
 
-# Inicializar bancos de dados
-init_db()
-init_auth_db()
+@st.cache_data(show_spinner=False, max_entries=32)
+def _gerar_csv_periodo(periodo, versao):
+    """Gera o CSV de um período (em cache por versão dos dados, compartilhado entre sessões)"""
+    return servico.exportar_periodo(periodo)
+
+# Migrar/verificar o banco uma única vez por processo (os reruns não repetem o schema)
+iniciar_secao('schema')
+garantir_schema()
 
 # Verificar se o usuário está logado
+iniciar_secao('sessão')
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
     st.session_state.username = None
     st.session_state.permissao = None
+    # Navegador reconectando com um cookie de sessão válido
+    restaurar_sessao()
+gravar_cookie_sessao()
 
 # Página de Login
 if not st.session_state.logged_in:
+    iniciar_secao('página Login')
     st.title("🔐 Login - Livro Caixa")
     
     col1, col2 = st.columns([1, 2])
@@ -612,19 +558,53 @@ if not st.session_state.logged_in:
                 if create_submitted:
                     if new_username and new_password and confirm_password:
                         if new_password == confirm_password:
-                            if create_user(new_username, new_password, permissao):
+                            criado = create_user(new_username, new_password, permissao)
+                            if criado:
                                 st.success(f"✅ Usuário '{new_username}' criado com sucesso!")
-                            else:
+                            elif criado is False:
                                 st.error("❌ Erro ao criar usuário. Nome de usuário já existe.")
                         else:
                             st.error("❌ As senhas não coincidem!")
                     else:
                         st.warning("⚠️ Preencha todos os campos!")
     
+    finalizar_execucao()
     st.stop()
 
+# Autor das escritas deste rerun no diário de auditoria
+definir_usuario(st.session_state.username)
+
+# Formato monetário das colunas numéricas exibidas (ex.: R$ 1,234.56); o banco guarda centavos
+FORMATO_REAL = "R$ %,.2f"
+
+@cronometrado
+def exibir_tabela_lancamentos(df):
+    """Exibe lançamentos (colunas do banco em maiúsculas) com formatação vetorizada"""
+    # Uma única cópia para exibição, preparada com operações vetorizadas:
+    # os valores continuam numéricos e a formatação fica a cargo do column_config
+    df_exibir = df.rename(columns={'HISTORICO': 'HISTÓRICO', 'SAIDA': 'SAÍDA'})
+    df_exibir['DATA'] = pd.to_datetime(df_exibir['DATA'])
+    # Centavos convertidos em reais só aqui; entradas e saídas zeradas aparecem vazias
+    df_exibir['ENTRADA'] = reais(df_exibir['ENTRADA'].where(df_exibir['ENTRADA'] > 0))
+    df_exibir['SAÍDA'] = reais(df_exibir['SAÍDA'].where(df_exibir['SAÍDA'] > 0))
+    df_exibir['SALDO'] = reais(df_exibir['SALDO'])
+    
+    # Exibir tabela responsiva
+    st.dataframe(
+        df_exibir,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'DATA': st.column_config.DateColumn('DATA', format='DD/MM/YYYY'),
+            'ENTRADA': st.column_config.NumberColumn('ENTRADA', format=FORMATO_REAL),
+            'SAÍDA': st.column_config.NumberColumn('SAÍDA', format=FORMATO_REAL),
+            'SALDO': st.column_config.NumberColumn('SALDO', format=FORMATO_REAL)
+        }
+    )
+
 # Aplicação principal (apenas para usuários logados)
 # Sidebar com logo e informações do usuário
+iniciar_secao('sidebar')
 with st.sidebar:
     # Tenta carregar a imagem do logo
     logo_carregado = carregar_imagem_logo("Logo_Loja.png")
@@ -721,15 +701,41 @@ with st.sidebar:
                                 st.error(message)
             else:
                 st.info("Nenhum usuário cadastrado.")
+        
+        # Manutenção do resumo materializado por período
+        with st.sidebar.expander("🛠️ Manutenção"):
+            st.caption("Resumo por período usado nos totais do sistema")
+            
+            if st.button("🔍 Verificar resumo", use_container_width=True):
+                with conexao() as conn:
+                    divergencias = verificar_resumo_periodos(conn)
+                if divergencias:
+                    st.warning(f"⚠️ {len(divergencias)} período(s) divergente(s): "
+                               + ", ".join(str(periodo) for periodo, _, _ in divergencias))
+                else:
+                    st.success("✅ Resumo consistente com os lançamentos.")
+            
+            if st.button("🔄 Reconstruir resumo", use_container_width=True):
+                servico.reconstruir_resumo()
+                st.success("✅ Resumo reconstruído!")
+            
+            # Além das fotos periódicas (ex.: antes de uma auditoria ou de um fechamento)
+            if st.button("📸 Registrar foto do livro", use_container_width=True):
+                servico.fotografar_livro()
+                st.success("✅ Foto do livro registrada!")
     
     st.markdown("---")
     
     pagina = st.radio(
         "**Navegação:**",
-        ["Ajuda", "Contas", "Lançamentos", "Balanço Financeiro", "Exportar Dados"],
+        ["Ajuda", "Contas", "Lançamentos", "Pesquisar", "Balanço Financeiro", "Exportar Dados", "Auditoria"]
+        + (["Desempenho"] if user_is_admin() else []),
         label_visibility="collapsed"
     )
 
+definir_pagina(pagina)
+iniciar_secao(f'página {pagina}')
+
 # Página: Ajuda
 if pagina == "Ajuda":
     st.title("📋 Ajuda - Livro Caixa")
@@ -749,10 +755,13 @@ if pagina == "Ajuda":
         - ✅ **Banco de Dados SQLite**: Dados salvos localmente
         - ✅ **Contas Personalizáveis**: Adicione suas próprias contas
         - ✅ **Edição de Lançamentos**: Edite ou exclua lançamentos existentes
+        - ✅ **Pesquisa**: Encontre lançamentos de qualquer mês pelo histórico ou complemento
         - ✅ **Relatórios**: Balanço financeiro com gráficos
         - ✅ **Exportação**: Backup dos dados em CSV
+        - ✅ **Auditoria**: Histórico de cada alteração e o livro como estava em qualquer data
         
-        **📝 Nota:** Não se esqueça do saldo inicial em janeiro!
+        **📝 Nota:** O saldo final de cada mês é transportado automaticamente como saldo
+        inicial do mês seguinte. Lance o saldo de abertura apenas no primeiro mês do livro.
         """)
         
         st.markdown("---")
@@ -764,6 +773,7 @@ if pagina == "Ajuda":
         3. **✏️ Editar**: Modifique ou exclua lançamentos existentes
         4. **📈 Balanço**: Veja relatórios e gráficos
         5. **💾 Exportar**: Faça backup dos dados
+        6. **🕵️ Auditoria**: Consulte quem alterou o quê e o livro em uma data passada
         """)
     
     with col2:
@@ -836,24 +846,29 @@ elif pagina == "Contas":
 elif pagina == "Lançamentos":
     st.title("📥 Lançamentos do Caixa")
     
-    meses = [
-        "Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
-        "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"
-    ]
+    # Layout responsivo para seleção de ano e mês
+    col0, col1, col2 = st.columns([1, 1, 3])
     
-    # Layout responsivo para seleção de mês
-    col1, col2 = st.columns([1, 3])
+    with col0:
+        ano_selecionado = st.selectbox("**Selecione o Ano**", get_anos())
     
     with col1:
-        mes_selecionado = st.selectbox("**Selecione o Mês**", meses)
+        mes_selecionado = st.selectbox("**Selecione o Mês**", MESES, index=datetime.now().month - 1)
     
     with col2:
-        st.info(f"💼 Trabalhando no mês de **{mes_selecionado}**")
+        st.info(f"💼 Trabalhando no mês de **{mes_selecionado}/{ano_selecionado}**")
         if not user_can_edit():
             st.warning("👀 **Modo de Visualização** - Você pode apenas visualizar os lançamentos.")
     
-    # Buscar lançamentos do banco
-    df_mes = get_lancamentos_mes(mes_selecionado)
+    # Data sugerida no formulário: hoje, se estiver no mês selecionado, senão o 1º dia do mês
+    hoje = datetime.now().date()
+    if periodo_da_data(hoje) == periodo_de(ano_selecionado, mes_selecionado):
+        data_sugerida = hoje
+    else:
+        data_sugerida = hoje.replace(year=ano_selecionado, month=MESES.index(mes_selecionado) + 1, day=1)
+    
+    # Contas do plano (nome -> id) para o formulário e o editor
+    contas = get_contas()
     
     # Apenas usuários com permissão de edição podem adicionar lançamentos
     if user_can_edit():
@@ -864,11 +879,12 @@ elif pagina == "Lançamentos":
             col3, col4, col5 = st.columns([2, 2, 1])
             
             with col3:
-                data = st.date_input("**Data**", datetime.now().date())
+                data = st.date_input("**Data**", data_sugerida)
                 historico = st.text_input("**Histórico**", placeholder="Descrição do lançamento...")
             
             with col4:
                 complemento = st.text_input("**Complemento**", placeholder="Informações adicionais...")
+                conta = st.selectbox("**Conta**", [None, *contas], format_func=lambda nome: nome or "(sem conta)")
                 tipo_movimento = st.selectbox("**Tipo de Movimento**", ["Entrada", "Saída"])
             
             with col5:
@@ -882,243 +898,298 @@ elif pagina == "Lançamentos":
             submitted = st.form_submit_button("💾 Salvar Lançamento", use_container_width=True)
             
             if submitted and historico:
-                # Calcular saldo
-                if df_mes.empty:
-                    saldo = entrada - saida
-                else:
-                    # Verifica se a coluna SALDO existe e tem dados
-                    if 'SALDO' in df_mes.columns and len(df_mes) > 0:
-                        saldo_anterior = df_mes.iloc[-1]['SALDO']
-                    else:
-                        saldo_anterior = 0.0
-                    saldo = saldo_anterior + entrada - saida
-                
-                # Salvar no banco
-                salvar_lancamento(mes_selecionado, data, historico, complemento, entrada, saida, saldo)
+                # Salvar no banco (o período e o saldo são derivados da data)
+                salvar_lancamento(data, historico, complemento, centavos(entrada), centavos(saida),
+                                  contas.get(conta))
                 st.rerun()
+        
+        # Importação em lote (extratos bancários e planilhas)
+        with st.expander("📤 Importar Lançamentos (CSV, OFX ou XLSX)"):
+            st.caption("CSV no mesmo layout do download do mês (separado por ponto e vírgula), "
+                       "extrato OFX do banco ou planilha XLSX com as colunas Data, Histórico e Entrada/Saída (ou Valor). "
+                       "O mês de cada lançamento é definido pela data; a coluna Conta (opcional) "
+                       "deve trazer o nome de uma conta cadastrada.")
+            arquivo_importacao = st.file_uploader("**Arquivo**", type=['csv', 'ofx', 'xlsx'])
+            if arquivo_importacao and st.button("📤 Importar", use_container_width=True):
+                with st.spinner("Importando lançamentos..."):
+                    if importar_lancamentos(arquivo_importacao, arquivo_importacao.name):
+                        st.rerun()
     else:
         st.info("💡 Para adicionar ou editar lançamentos, solicite permissão de edição ao administrador.")
     
     # Exibir lançamentos do mês com opção de edição
-    st.subheader(f"📋 Lançamentos - {mes_selecionado}")
+    st.subheader(f"📋 Lançamentos - {mes_selecionado}/{ano_selecionado}")
+    
+    # Totais do mês a partir do resumo agregado (em cache)
+    periodo_selecionado = periodo_de(ano_selecionado, mes_selecionado)
+    resumo_mes = get_resumo_mensal(ano_selecionado)
+    resumo_mes = resumo_mes[resumo_mes['periodo'] == periodo_selecionado]
     
-    if not df_mes.empty:
-        # Mapear colunas do banco para os nomes exibidos
-        colunas_mapeadas = {
-            'ID': 'ID',
-            'DATA': 'DATA',
-            'HISTORICO': 'HISTÓRICO', 
-            'COMPLEMENTO': 'COMPLEMENTO',
-            'ENTRADA': 'ENTRADA',
-            'SAIDA': 'SAÍDA',
-            'SALDO': 'SALDO'
+    if not resumo_mes.empty:
+        # Filtros aplicados diretamente na consulta ao banco
+        with st.expander("🔎 Filtros"):
+            colf1, colf2, colf3 = st.columns(3)
+            with colf1:
+                intervalo_filtro = st.date_input("**Intervalo de datas**", value=(), format="DD/MM/YYYY")
+                tipo_filtro = st.selectbox("**Tipo**", ["Todos", "Entrada", "Saída"])
+            with colf2:
+                texto_filtro = st.text_input("**Histórico ou complemento contém**")
+                tamanho_pagina = st.selectbox("**Lançamentos por página**", [25, 50, 100, 250], index=1)
+            with colf3:
+                valor_minimo = st.number_input("**Valor mínimo (R$)**", min_value=0.0, value=None, step=0.01, format="%.2f")
+                valor_maximo = st.number_input("**Valor máximo (R$)**", min_value=0.0, value=None, step=0.01, format="%.2f")
+        
+        filtros = {
+            'data_inicio': intervalo_filtro[0] if len(intervalo_filtro) > 0 else None,
+            'data_fim': intervalo_filtro[1] if len(intervalo_filtro) > 1 else None,
+            'texto': texto_filtro.strip() or None,
+            'valor_minimo': centavos(valor_minimo) if valor_minimo is not None else None,
+            'valor_maximo': centavos(valor_maximo) if valor_maximo is not None else None,
+            'tipo': {'Entrada': 'entrada', 'Saída': 'saida'}.get(tipo_filtro)
         }
         
-        # Filtrar apenas colunas que existem no DataFrame
-        colunas_existentes = [col for col in colunas_mapeadas.keys() if col in df_mes.columns]
+        # Paginação por cursor (data, id): pilha com o cursor inicial de cada página visitada,
+        # reiniciada sempre que o mês, os filtros ou o tamanho da página mudam
+        chave_paginacao = (periodo_selecionado, tuple(filtros.items()), tamanho_pagina)
+        if st.session_state.get('paginacao_chave') != chave_paginacao:
+            st.session_state.paginacao_chave = chave_paginacao
+            st.session_state.paginacao_cursores = [None]
+        cursores = st.session_state.paginacao_cursores
         
-        if colunas_existentes:
-            df_exibir = df_mes[colunas_existentes].copy()
-            
-            # Renomear colunas para exibição
-            df_exibir.columns = [colunas_mapeadas[col] for col in colunas_existentes]
+        df_pagina, tem_proxima, (total_filtrado, entradas_filtradas, saidas_filtradas) = get_pagina_lancamentos(
+            ano_selecionado, mes_selecionado, filtros, cursores[-1], tamanho_pagina)
+        
+        if not df_pagina.empty:
+            exibir_tabela_lancamentos(df_pagina)
             
-            # Formatar colunas para exibição
-            df_exibir_display = df_exibir.copy()
-            if 'DATA' in df_exibir_display.columns:
-                df_exibir_display['DATA'] = pd.to_datetime(df_exibir_display['DATA']).dt.strftime('%d/%m/%Y')
-            if 'ENTRADA' in df_exibir_display.columns:
-                df_exibir_display['ENTRADA'] = df_exibir_display['ENTRADA'].apply(lambda x: f"R$ {x:,.2f}" if x > 0 else "")
-            if 'SAÍDA' in df_exibir_display.columns:
-                df_exibir_display['SAÍDA'] = df_exibir_display['SAÍDA'].apply(lambda x: f"R$ {x:,.2f}" if x > 0 else "")
-            if 'SALDO' in df_exibir_display.columns:
-                df_exibir_display['SALDO'] = df_exibir_display['SALDO'].apply(lambda x: f"R$ {x:,.2f}")
+            # Totais da página e dos filtros (o SALDO é sempre o saldo acumulado do mês)
+            st.caption(
+                f"Página {len(cursores)} • {len(df_pagina)} de {total_filtrado} lançamentos encontrados • "
+                f"Página: entradas {formatar_reais(df_pagina['ENTRADA'].sum())} / "
+                f"saídas {formatar_reais(df_pagina['SAIDA'].sum())} • "
+                f"Filtro: entradas {formatar_reais(entradas_filtradas)} / saídas {formatar_reais(saidas_filtradas)}"
+            )
             
-            # Exibir tabela responsiva
-            st.dataframe(df_exibir_display, use_container_width=True, hide_index=True)
+            col_anterior, col_proxima = st.columns(2)
+            with col_anterior:
+                if st.button("⬅️ Anterior", use_container_width=True, disabled=len(cursores) == 1):
+                    cursores.pop()
+                    st.rerun()
+            with col_proxima:
+                if st.button("Próxima ➡️", use_container_width=True, disabled=not tem_proxima):
+                    ultimo = df_pagina.iloc[-1]
+                    cursores.append((str(ultimo['DATA']), int(ultimo['ID'])))
+                    st.rerun()
             
-            # Download CSV individual do mês
+            # Download CSV individual do mês (gerado apenas no clique)
             st.subheader("📥 Download do Mês")
-            csv_data = download_csv_mes(mes_selecionado)
-            if csv_data:
-                st.download_button(
-                    label=f"💾 Baixar {mes_selecionado} em CSV",
-                    data=csv_data,
-                    file_name=f"livro_caixa_{mes_selecionado}_{datetime.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
+            st.download_button(
+                label=f"💾 Baixar {mes_selecionado}/{ano_selecionado} em CSV",
+                data=lambda: download_csv_mes(ano_selecionado, mes_selecionado),
+                file_name=f"livro_caixa_{mes_selecionado}_{ano_selecionado}_{datetime.now().strftime('%Y%m%d')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
             
             # Apenas usuários com permissão de edição podem gerenciar lançamentos
             if user_can_edit():
                 # Seção de Edição de Lançamentos
                 st.subheader("✏️ Gerenciar Lançamentos")
+                st.caption("Edite as células ou marque **Excluir** nas linhas desejadas; "
+                           "todas as alterações da página são gravadas juntas.")
                 
-                # Selecionar lançamento para editar
-                if 'ID' in df_exibir.columns:
-                    lancamentos_opcoes = []
-                    for idx, row in df_exibir.iterrows():
-                        valor = row['ENTRADA'] if row['ENTRADA'] > 0 else row['SAÍDA']
-                        descricao = f"{row['DATA']} - {row['HISTÓRICO']} - R$ {valor:,.2f}"
-                        lancamentos_opcoes.append((row['ID'], descricao))
-                    
-                    if lancamentos_opcoes:
-                        lancamento_selecionado = st.selectbox(
-                            "**Selecione o lançamento para editar/excluir:**",
-                            options=lancamentos_opcoes,
-                            format_func=lambda x: x[1]
-                        )
-                        
-                        if lancamento_selecionado:
-                            lancamento_id = lancamento_selecionado[0]
-                            lancamento_data = df_exibir[df_exibir['ID'] == lancamento_id].iloc[0]
-                            
-                            col_edit, col_del = st.columns([3, 1])
-                            
-                            with col_edit:
-                                # Formulário de edição
-                                with st.form("form_editar_lancamento"):
-                                    st.write("**Editar Lançamento:**")
-                                    col6, col7, col8 = st.columns([2, 2, 1])
-                                    
-                                    with col6:
-                                        data_editar = st.date_input("**Data**", 
-                                                                  value=datetime.strptime(str(lancamento_data['DATA']), '%Y-%m-%d').date() 
-                                                                  if isinstance(lancamento_data['DATA'], str) 
-                                                                  else lancamento_data['DATA'].date())
-                                        historico_editar = st.text_input("**Histórico**", value=lancamento_data['HISTÓRICO'])
-                                    
-                                    with col7:
-                                        complemento_editar = st.text_input("**Complemento**", value=lancamento_data['COMPLEMENTO'] 
-                                                                          if pd.notna(lancamento_data['COMPLEMENTO']) else "")
-                                        
-                                        # Determinar tipo de movimento baseado nos valores
-                                        if lancamento_data['ENTRADA'] > 0:
-                                            tipo_movimento_editar = "Entrada"
-                                            entrada_editar = st.number_input("**Valor Entrada (R$)**", 
-                                                                            value=float(lancamento_data['ENTRADA']), 
-                                                                            min_value=0.0, step=0.01, format="%.2f")
-                                            saida_editar = 0.0
-                                        else:
-                                            tipo_movimento_editar = "Saída"
-                                            saida_editar = st.number_input("**Valor Saída (R$)**", 
-                                                                          value=float(lancamento_data['SAÍDA']), 
-                                                                          min_value=0.0, step=0.01, format="%.2f")
-                                            entrada_editar = 0.0
-                                    
-                                    with col8:
-                                        st.write("")  # Espaçamento
-                                        st.write("")  # Espaçamento
-                                        submitted_editar = st.form_submit_button("💾 Atualizar", use_container_width=True)
-                                    
-                                    if submitted_editar and historico_editar:
-                                        # Atualizar lançamento no banco
-                                        if atualizar_lancamento(lancamento_id, mes_selecionado, data_editar, historico_editar, 
-                                                              complemento_editar, entrada_editar, saida_editar):
-                                            st.success("✅ Lançamento atualizado com sucesso!")
-                                            st.rerun()
-                            
-                            with col_del:
-                                st.write("**Excluir:**")
-                                if st.button("🗑️ Excluir", use_container_width=True, type="secondary"):
-                                    if st.checkbox("✅ Confirmar exclusão"):
-                                        if excluir_lancamento(lancamento_id, mes_selecionado):
-                                            st.success("✅ Lançamento excluído com sucesso!")
-                                            st.rerun()
-            
-            # Estatísticas do mês
-            st.subheader("📊 Estatísticas do Mês")
-            
-            col9, col10, col11 = st.columns(3)
-            
-            total_entradas = df_mes['ENTRADA'].sum() if 'ENTRADA' in df_mes.columns else 0.0
-            total_saidas = df_mes['SAIDA'].sum() if 'SAIDA' in df_mes.columns else 0.0
-            
-            if 'SALDO' in df_mes.columns and len(df_mes) > 0:
-                saldo_atual = df_mes.iloc[-1]['SALDO']
-            else:
-                saldo_atual = 0.0
+                # Cópia editável da página (valores em reais; saldos são recalculados ao gravar)
+                df_edicao = df_pagina[['ID', 'DATA', 'HISTORICO', 'COMPLEMENTO', 'CONTA', 'ENTRADA', 'SAIDA']].copy()
+                df_edicao['DATA'] = pd.to_datetime(df_edicao['DATA']).dt.date
+                df_edicao['ENTRADA'] = reais(df_edicao['ENTRADA'])
+                df_edicao['SAIDA'] = reais(df_edicao['SAIDA'])
+                df_edicao['COMPLEMENTO'] = df_edicao['COMPLEMENTO'].fillna('')
+                df_edicao['EXCLUIR'] = False
+                
+                with st.form("form_editar_lancamentos"):
+                    df_editado = st.data_editor(
+                        df_edicao,
+                        use_container_width=True,
+                        hide_index=True,
+                        num_rows="fixed",
+                        disabled=['ID'],
+                        column_config={
+                            'DATA': st.column_config.DateColumn('DATA', format='DD/MM/YYYY', required=True),
+                            'HISTORICO': st.column_config.TextColumn('HISTÓRICO', required=True),
+                            'CONTA': st.column_config.SelectboxColumn('CONTA', options=list(contas)),
+                            'ENTRADA': st.column_config.NumberColumn('ENTRADA', format=FORMATO_REAL, min_value=0.0, step=0.01),
+                            'SAIDA': st.column_config.NumberColumn('SAÍDA', format=FORMATO_REAL, min_value=0.0, step=0.01),
+                            'EXCLUIR': st.column_config.CheckboxColumn('EXCLUIR')
+                        }
+                    )
+                    submitted_lote = st.form_submit_button("💾 Aplicar alterações", use_container_width=True)
+                
+                if submitted_lote:
+                    try:
+                        alterados, excluidos = lancamentos_alterados(df_edicao, df_editado, contas)
+                    except ValueError as e:
+                        st.error(f"❌ Valor inválido na tabela: {e}")
+                    else:
+                        if not alterados and not excluidos:
+                            st.info("Nenhuma alteração para aplicar.")
+                        elif aplicar_lancamentos_em_lote(alterados, excluidos):
+                            st.success(f"✅ {len(alterados)} lançamento(s) atualizado(s) e {len(excluidos)} excluído(s)!")
+                            st.rerun()
             
-            with col9:
-                st.metric("💰 Total de Entradas", f"R$ {total_entradas:,.2f}")
-            with col10:
-                st.metric("💸 Total de Saídas", f"R$ {total_saidas:,.2f}")
-            with col11:
-                st.metric("🏦 Saldo Atual", f"R$ {saldo_atual:,.2f}")
         else:
-            st.warning("⚠️ Estrutura de dados incompatível.")
-            st.dataframe(df_mes, use_container_width=True)
+            st.info("🔎 Nenhum lançamento corresponde aos filtros.")
+        
+        # Estatísticas do mês
+        st.subheader("📊 Estatísticas do Mês")
+        
+        col9, col10, col11 = st.columns(3)
+        
+        total_entradas = resumo_mes['entradas'].iloc[0]
+        total_saidas = resumo_mes['saidas'].iloc[0]
+        saldo_inicial = resumo_mes['saldo_inicial'].iloc[0]
+        saldo_atual = resumo_mes['saldo'].iloc[0]
+        
+        with col9:
+            st.metric("💰 Total de Entradas", formatar_reais(total_entradas))
+        with col10:
+            st.metric("💸 Total de Saídas", formatar_reais(total_saidas))
+        with col11:
+            st.metric("🏦 Saldo Atual", formatar_reais(saldo_atual))
+        st.caption(f"Saldo inicial transportado do mês anterior: {formatar_reais(saldo_inicial)}")
     else:
-        st.info(f"📭 Nenhum lançamento encontrado para {mes_selecionado}")
+        st.info(f"📭 Nenhum lançamento encontrado para {mes_selecionado}/{ano_selecionado}")
     
     # Botão para limpar lançamentos do mês (apenas editores)
     if user_can_edit():
-        if st.button(f"🗑️ Limpar TODOS os Lançamentos de {mes_selecionado}", use_container_width=True, type="secondary"):
+        if st.button(f"🗑️ Limpar TODOS os Lançamentos de {mes_selecionado}/{ano_selecionado}", use_container_width=True, type="secondary"):
             if st.checkbox("✅ Confirmar exclusão de TODOS os lançamentos"):
-                limpar_lancamentos_mes(mes_selecionado)
+                limpar_lancamentos_mes(ano_selecionado, mes_selecionado)
                 st.rerun()
 
+# Página: Pesquisar
+elif pagina == "Pesquisar":
+    st.title("🔎 Pesquisar Lançamentos")
+    
+    col1, col2 = st.columns([2, 1])
+    
+    with col1:
+        texto_busca = st.text_input("**Histórico ou complemento**", placeholder="Ex: energia, aluguel, nome do fornecedor...")
+    
+    with col2:
+        intervalo_busca = st.date_input("**Intervalo de datas (opcional)**", value=(), format="DD/MM/YYYY")
+    
+    if texto_busca.strip():
+        df_busca = get_busca_lancamentos(
+            texto_busca.strip(),
+            intervalo_busca[0] if len(intervalo_busca) > 0 else None,
+            intervalo_busca[1] if len(intervalo_busca) > 1 else None
+        )
+        
+        if df_busca.empty:
+            st.info("📭 Nenhum lançamento encontrado.")
+        else:
+            st.caption(f"{len(df_busca)} lançamentos encontrados em todos os meses, ordenados por relevância")
+            exibir_tabela_lancamentos(df_busca)
+            
+            col3, col4 = st.columns(2)
+            with col3:
+                st.metric("💰 Entradas encontradas", formatar_reais(df_busca['ENTRADA'].sum()))
+            with col4:
+                st.metric("💸 Saídas encontradas", formatar_reais(df_busca['SAIDA'].sum()))
+    else:
+        st.info("💡 Digite uma ou mais palavras para pesquisar em todos os lançamentos.")
+
 # Página: Balanço Financeiro
 elif pagina == "Balanço Financeiro":
     st.title("📈 Balanço Financeiro")
     
-    # Calcular totais anuais
-    total_entradas_anual = 0.0
-    total_saidas_anual = 0.0
-    dados_mensais = []
-    
-    meses = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
-            "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+    ano_balanco = st.selectbox("**Selecione o Ano**", get_anos())
     
     with st.spinner("📊 Calculando balanço..."):
-        for mes in meses:
-            df_mes = get_lancamentos_mes(mes)
-            if not df_mes.empty:
-                entradas_mes = df_mes['ENTRADA'].sum() if 'ENTRADA' in df_mes.columns else 0.0
-                saidas_mes = df_mes['SAIDA'].sum() if 'SAIDA' in df_mes.columns else 0.0
-                
-                if 'SALDO' in df_mes.columns and len(df_mes) > 0:
-                    saldo_mes = df_mes.iloc[-1]['SALDO']
-                else:
-                    saldo_mes = 0.0
-                
-                total_entradas_anual += entradas_mes
-                total_saidas_anual += saidas_mes
-                
-                dados_mensais.append({
-                    'Mês': mes,
-                    'Entradas': entradas_mes,
-                    'Saídas': saidas_mes,
-                    'Saldo': saldo_mes
-                })
+        # Uma única consulta agregada (em cache até a próxima alteração de lançamentos)
+        resumo = get_resumo_mensal(ano_balanco)
+    
+    # Calcular totais anuais (somas de centavos em int64)
+    total_entradas_anual = int(resumo['entradas'].sum())
+    total_saidas_anual = int(resumo['saidas'].sum())
+    dados_mensais = [
+        {
+            'Mês': nome_mes(int(linha['periodo'])),
+            'Entradas': linha['entradas'],
+            'Saídas': linha['saidas'],
+            'Saldo Inicial': linha['saldo_inicial'],
+            'Saldo': linha['saldo'],
+            'Lançamentos': int(linha['lancamentos'])
+        }
+        for _, linha in resumo.iterrows()
+    ]
     
-    saldo_final_anual = total_entradas_anual - total_saidas_anual
+    # Saldo final do ano = saldo final do último mês com lançamentos (inclui os anos anteriores)
+    resultado_anual = total_entradas_anual - total_saidas_anual
+    saldo_final_anual = int(resumo['saldo'].iloc[-1]) if not resumo.empty else 0
     
     # Layout responsivo
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("📥 Débitos")
-        st.metric("**Total de Entradas Anual**", f"R$ {total_entradas_anual:,.2f}")
+        st.metric(f"**Total de Entradas {ano_balanco}**", formatar_reais(total_entradas_anual))
         
         st.subheader("📅 Resumo por Mês")
         for dados in dados_mensais:
             with st.expander(f"📁 {dados['Mês']}"):
-                st.write(f"**Entradas:** R$ {dados['Entradas']:,.2f}")
-                st.write(f"**Saídas:** R$ {dados['Saídas']:,.2f}")
-                st.write(f"**Saldo:** R$ {dados['Saldo']:,.2f}")
+                st.write(f"**Saldo Inicial:** {formatar_reais(dados['Saldo Inicial'])}")
+                st.write(f"**Entradas:** {formatar_reais(dados['Entradas'])}")
+                st.write(f"**Saídas:** {formatar_reais(dados['Saídas'])}")
+                st.write(f"**Saldo:** {formatar_reais(dados['Saldo'])}")
+                st.write(f"**Lançamentos:** {dados['Lançamentos']}")
     
     with col2:
         st.subheader("📤 Créditos")
-        st.metric("**Total de Saídas Anual**", f"R$ {total_saidas_anual:,.2f}")
-        st.metric("**Saldo Final Anual**", f"R$ {saldo_final_anual:,.2f}", 
-                 delta=f"R$ {saldo_final_anual:,.2f}")
+        st.metric(f"**Total de Saídas {ano_balanco}**", formatar_reais(total_saidas_anual))
+        st.metric(f"**Saldo Final {ano_balanco}**", formatar_reais(saldo_final_anual), 
+                 delta=formatar_reais(resultado_anual))
         
         # Gráfico simples de barras
         if dados_mensais:
             st.subheader("📊 Resumo Visual")
-            df_grafico = pd.DataFrame(dados_mensais)
-            st.bar_chart(df_grafico.set_index('Mês')[['Entradas', 'Saídas']], use_container_width=True)
+            df_grafico = pd.DataFrame(dados_mensais).set_index('Mês')[['Entradas', 'Saídas']]
+            st.bar_chart(reais(df_grafico), use_container_width=True)
+    
+    # Resumo por conta: uma consulta agrupada por mês e conta (em cache), somada por conta no pandas
+    resumo_contas = get_resumo_contas(ano_balanco)
+    if not resumo_contas.empty:
+        st.subheader("🗂️ Resumo por Conta")
+        resumo_contas['conta'] = resumo_contas['conta'].fillna('(sem conta)')
+        por_conta = resumo_contas.groupby('conta')[['entradas', 'saidas', 'lancamentos']].sum()
+        por_conta['resultado'] = por_conta['entradas'] - por_conta['saidas']
+        por_conta = por_conta.sort_values('resultado')
+        
+        st.dataframe(
+            pd.DataFrame({
+                'CONTA': por_conta.index,
+                'ENTRADAS': reais(por_conta['entradas']).values,
+                'SAÍDAS': reais(por_conta['saidas']).values,
+                'RESULTADO': reais(por_conta['resultado']).values,
+                'LANÇAMENTOS': por_conta['lancamentos'].values,
+            }),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'ENTRADAS': st.column_config.NumberColumn('ENTRADAS', format=FORMATO_REAL),
+                'SAÍDAS': st.column_config.NumberColumn('SAÍDAS', format=FORMATO_REAL),
+                'RESULTADO': st.column_config.NumberColumn('RESULTADO', format=FORMATO_REAL)
+            }
+        )
+        
+        with st.expander("📅 Resultado por conta e mês"):
+            resumo_contas['resultado'] = resumo_contas['entradas'] - resumo_contas['saidas']
+            por_mes = resumo_contas.pivot_table(index='conta', columns='periodo', values='resultado',
+                                                aggfunc='sum', fill_value=0)
+            por_mes.columns = [nome_mes(int(periodo)) for periodo in por_mes.columns]
+            st.dataframe(reais(por_mes), use_container_width=True,
+                         column_config={mes: st.column_config.NumberColumn(mes, format=FORMATO_REAL)
+                                        for mes in por_mes.columns})
 
 # Página: Exportar Dados
 elif pagina == "Exportar Dados":
@@ -1131,38 +1202,41 @@ elif pagina == "Exportar Dados":
         
         st.info("💡 Os arquivos CSV podem ser abertos diretamente no Excel")
         
+        ano_exportar = st.selectbox("**Selecione o ano:**", get_anos())
+        
         # Download de CSV individual por mês
         st.subheader("📥 Download por Mês")
-        meses = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho",
-                "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+        mes_download = st.selectbox("**Selecione o mês para download:**", MESES)
         
-        mes_download = st.selectbox("**Selecione o mês para download:**", meses)
-        csv_data = download_csv_mes(mes_download)
-        
-        if csv_data:
+        # O resumo (em cache) diz se o mês tem dados; o CSV só é gerado no clique
+        resumo_exportar = get_resumo_mensal(ano_exportar)
+        if periodo_de(ano_exportar, mes_download) in set(resumo_exportar['periodo']):
             st.download_button(
-                label=f"💾 Baixar {mes_download} em CSV",
-                data=csv_data,
-                file_name=f"livro_caixa_{mes_download}_{datetime.now().strftime('%Y%m%d')}.csv",
+                label=f"💾 Baixar {mes_download}/{ano_exportar} em CSV",
+                data=lambda: download_csv_mes(ano_exportar, mes_download),
+                file_name=f"livro_caixa_{mes_download}_{ano_exportar}_{datetime.now().strftime('%Y%m%d')}.csv",
                 mime="text/csv",
                 use_container_width=True
             )
         else:
-            st.warning(f"📭 Nenhum dado encontrado para {mes_download}")
+            st.warning(f"📭 Nenhum dado encontrado para {mes_download}/{ano_exportar}")
         
         st.markdown("---")
         
         # Exportação completa
         st.subheader("📦 Exportação Completa")
-        if st.button("📦 Exportar Todos os Dados", use_container_width=True):
+        if st.button(f"📦 Exportar Todos os Dados de {ano_exportar}", use_container_width=True):
             with st.spinner("Gerando arquivo ZIP..."):
-                output = exportar_para_csv()
+                barra_progresso = st.progress(0.0)
+                output = exportar_para_csv(ano_exportar,
+                                           lambda fracao, texto: barra_progresso.progress(fracao, text=texto))
+                barra_progresso.empty()
                 
                 if output is not None:
                     st.download_button(
                         label="💾 Baixar Arquivo ZIP Completo",
-                        data=output,
-                        file_name=f"livro_caixa_completo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                        data=output.read(),
+                        file_name=f"livro_caixa_completo_{ano_exportar}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
                         mime="application/zip",
                         use_container_width=True
                     )
@@ -1174,19 +1248,13 @@ elif pagina == "Exportar Dados":
         st.subheader("📊 Informações do Sistema")
         
         # Estatísticas do banco
-        conn = sqlite3.connect('livro_caixa.db', check_same_thread=False)
-        
         try:
-            total_lancamentos = pd.read_sql("SELECT COUNT(*) as total FROM lancamentos", conn).iloc[0]['total']
-            total_contas = pd.read_sql("SELECT COUNT(*) as total FROM contas", conn).iloc[0]['total']
-            meses_com_dados = pd.read_sql("SELECT COUNT(DISTINCT mes) as total FROM lancamentos", conn).iloc[0]['total']
+            total_lancamentos, total_contas, meses_com_dados = get_estatisticas()
         except:
             total_lancamentos = 0
             total_contas = 0
             meses_com_dados = 0
         
-        conn.close()
-        
         st.metric("📝 Total de Lançamentos", total_lancamentos)
         st.metric("📋 Total de Contas", total_contas)
         st.metric("📅 Meses com Dados", meses_com_dados)
@@ -1201,7 +1269,101 @@ elif pagina == "Exportar Dados":
         - **Usuários:** Múltiplos usuários suportados
         """)
 
+# Página: Auditoria
+elif pagina == "Auditoria":
+    st.title("🕵️ Auditoria")
+    st.caption("Inclusões, alterações e exclusões de lançamentos, com autor e horário (UTC)")
+    
+    st.subheader("📜 Diário de alterações")
+    lancamento_auditado = st.number_input("**ID do lançamento (0 = todos)**", min_value=0, step=1, value=0)
+    alteracoes = get_diario(int(lancamento_auditado) or None)
+    
+    if alteracoes:
+        nomes_contas = {conta_id: nome for nome, conta_id in get_contas().items()}
+        operacoes = {'inclusao': '➕ Inclusão', 'alteracao': '✏️ Alteração', 'exclusao': '🗑️ Exclusão'}
+        st.dataframe(
+            pd.DataFrame({
+                'Quando (UTC)': [alteracao['quando'][:19] for alteracao in alteracoes],
+                'Usuário': [alteracao['usuario'] or '—' for alteracao in alteracoes],
+                'Operação': [operacoes[alteracao['operacao']] for alteracao in alteracoes],
+                'Lançamento': [alteracao['lancamento_id'] for alteracao in alteracoes],
+                'Antes': [descrever_lancamento(alteracao['antes'], nomes_contas) for alteracao in alteracoes],
+                'Depois': [descrever_lancamento(alteracao['depois'], nomes_contas) for alteracao in alteracoes],
+            }),
+            use_container_width=True, hide_index=True
+        )
+        st.caption(f"{len(alteracoes)} alterações mais recentes")
+    else:
+        st.info("📭 Nenhuma alteração registrada.")
+    
+    st.subheader("🕰️ Livro em uma data")
+    st.caption("Reconstruído pela foto do livro mais próxima e pelas alterações posteriores a ela")
+    agora_utc = datetime.now(timezone.utc)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        ano_auditado = st.selectbox("**Ano**", get_anos(), key="ano_auditoria")
+    with col2:
+        mes_auditado = st.selectbox("**Mês**", MESES, index=datetime.now().month - 1, key="mes_auditoria")
+    with col3:
+        data_momento = st.date_input("**Data (UTC)**", value=agora_utc.date(), format="DD/MM/YYYY")
+    with col4:
+        hora_momento = st.time_input("**Hora (UTC)**", value=agora_utc.time().replace(second=0, microsecond=0))
+    
+    df_momento = get_livro_no_momento(f"{data_momento} {hora_momento}", ano_auditado, mes_auditado)
+    if df_momento.empty:
+        st.info(f"📭 Nenhum lançamento em {mes_auditado}/{ano_auditado} nesse momento.")
+    else:
+        exibir_tabela_lancamentos(df_momento)
+        col5, col6 = st.columns(2)
+        with col5:
+            st.metric("💰 Entradas", formatar_reais(df_momento['ENTRADA'].sum()))
+        with col6:
+            st.metric("💸 Saídas", formatar_reais(df_momento['SAIDA'].sum()))
+
+# Página: Desempenho (apenas para admin)
+elif pagina == "Desempenho" and user_is_admin():
+    st.title("⏱️ Desempenho")
+    st.caption("Tempos dos reruns medidos neste processo do servidor (últimas execuções de cada página)")
+    
+    formato_ms = {coluna: st.column_config.NumberColumn(coluna, format="%.1f")
+                  for coluna in ['p50 (ms)', 'p95 (ms)', 'SQL p95 (ms)', 'Duração (ms)', 'Início (ms)']}
+    
+    ultima_execucao = st.session_state.get('ultima_execucao')
+    if ultima_execucao:
+        st.subheader("🔁 Último rerun desta sessão")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("⏱️ Duração", f"{ultima_execucao['duracao_ms']:.1f} ms")
+        with col2:
+            st.metric("🗄️ Consultas SQL", ultima_execucao['consultas'])
+        with col3:
+            st.metric("⌛ Tempo em SQL", f"{ultima_execucao['tempo_consultas_ms']:.1f} ms")
+        st.caption(f"Página: {ultima_execucao['pagina']}")
+        st.dataframe(
+            pd.DataFrame(ultima_execucao['spans']).rename(
+                columns={'nome': 'Span', 'inicio_ms': 'Início (ms)', 'duracao_ms': 'Duração (ms)'}),
+            use_container_width=True, hide_index=True, column_config=formato_ms
+        )
+    
+    paginas_medidas = resumo_paginas()
+    if paginas_medidas:
+        st.subheader("📄 Por página")
+        st.dataframe(pd.DataFrame(paginas_medidas), use_container_width=True, hide_index=True,
+                     column_config=formato_ms)
+        
+        st.subheader("🧩 Por span (funções de dados e seções)")
+        st.dataframe(pd.DataFrame(resumo_spans()), use_container_width=True, hide_index=True,
+                     column_config=formato_ms)
+    else:
+        st.info("📭 Nenhuma execução medida ainda.")
+    
+    if ARQUIVO_LOG:
+        st.caption(f"📝 Log JSON das execuções: {ARQUIVO_LOG}")
+    else:
+        st.caption("💡 Defina LIVRO_CAIXA_LOG_DESEMPENHO para gravar cada rerun em um arquivo JSON (uma linha por execução).")
+
 # Rodapé
+iniciar_secao('rodapé')
 st.markdown("---")
 st.markdown(
     """
@@ -1211,7 +1373,9 @@ st.markdown(
         Usuário: {username} | 
         {date}
     </div>
-    """.format(username=st.session_state.username, date=datetime.now().strftime('%d/%m/%Y %H:%M')),
+    """.format(username=html.escape(st.session_state.username), date=datetime.now().strftime('%d/%m/%Y %H:%M')),
     unsafe_allow_html=True
 )
 
+# Fim da medição do rerun (exibida na página Desempenho no próximo rerun)
+st.session_state.ultima_execucao = finalizar_execucao()
@@ -0,0 +1,140 @@
+import threading
+
+from auth import gerar_hash, criar_tabela_segredos
+from database import (conexao, transacao, migrar_periodos, criar_tabela_versoes, criar_busca_textual,
+                      criar_resumo_periodos, criar_indices, verificar_planos, migrar_centavos,
+                      vincular_contas, criar_auditoria, criar_triggers_auditoria)
+
+# Migrações do schema, aplicadas em ordem e registradas em schema_version.
+# As primeiras são idempotentes porque bancos anteriores a este controle já
+# podem ter parte das tabelas; migrações novas entram sempre no fim da lista.
+CONTAS_PADRAO = [
+    'Salários',
+    'Aluguel',
+    'Energia Elétrica',
+    'Água',
+    'Telefone',
+    'Internet',
+    'Material de Expediente',
+    'Transporte',
+    'Alimentação',
+    'Manutenção',
+    'Vendas',
+    'Serviços Prestados',
+    'Consultoria',
+    'Outras Receitas',
+    'Outras Despesas'
+]
+
+
+def _tabelas_iniciais(conn):
+    """Tabelas de lançamentos, contas e usuários, com os dados padrão"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS lancamentos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mes TEXT NOT NULL,
+            periodo INTEGER,
+            data DATE NOT NULL,
+            historico TEXT NOT NULL,
+            complemento TEXT,
+            entrada REAL DEFAULT 0,
+            saida REAL DEFAULT 0,
+            saldo REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Tabela SIMPLIFICADA para contas (sem separação Receitas/Despesas)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS contas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if conn.execute('SELECT COUNT(*) FROM contas').fetchone()[0] == 0:
+        conn.executemany('INSERT OR IGNORE INTO contas (nome) VALUES (?)', [(conta,) for conta in CONTAS_PADRAO])
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            permissao TEXT NOT NULL DEFAULT 'visualizador',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if conn.execute('SELECT COUNT(*) FROM usuarios WHERE username = ?', ('admin',)).fetchone()[0] == 0:
+        # Senhas padrão: "admin123" e "visual123"
+        conn.executemany('INSERT INTO usuarios (username, password_hash, permissao) VALUES (?, ?, ?)', [
+            ('admin', gerar_hash('admin123'), 'admin'),
+            ('visual', gerar_hash('visual123'), 'visualizador'),
+        ])
+
+
+MIGRACOES = [
+    (1, 'tabelas iniciais', _tabelas_iniciais),
+    (2, 'período contábil AAAAMM', migrar_periodos),
+    (3, 'versões dos dados', criar_tabela_versoes),
+    (4, 'índices das consultas críticas', criar_indices),
+    (5, 'busca textual (FTS5)', criar_busca_textual),
+    (6, 'resumo por período com transporte de saldos', criar_resumo_periodos),
+    (7, 'chave das sessões', criar_tabela_segredos),
+    (8, 'valores em centavos inteiros', migrar_centavos),
+    (9, 'lançamentos vinculados às contas', vincular_contas),
+    (10, 'diário de auditoria e fotos do livro', criar_auditoria),
+    (11, 'autor do diário sem função registrada pela aplicação', criar_triggers_auditoria),
+]
+
+
+def versao_schema(conn):
+    """Retorna a versão atual do schema (0 em um banco sem migrações registradas)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(versao), 0) FROM schema_version').fetchone()[0]
+
+
+def aplicar_migracoes(conn):
+    """Aplica, na transação informada, as migrações ainda não registradas; retorna as aplicadas"""
+    atual = versao_schema(conn)
+    aplicadas = []
+    for versao, descricao, migracao in MIGRACOES:
+        if versao <= atual:
+            continue
+        migracao(conn)
+        conn.execute('INSERT INTO schema_version (versao, descricao) VALUES (?, ?)', (versao, descricao))
+        aplicadas.append((versao, descricao))
+    return aplicadas
+
+
+_trava = threading.Lock()
+_schema_pronto = False
+
+
+def garantir_schema():
+    """Migra o banco e verifica os planos de consulta uma única vez por processo"""
+    global _schema_pronto
+    if _schema_pronto:
+        return
+    with _trava:
+        if _schema_pronto:
+            return
+        # A leitura da versão fica dentro da transação (BEGIN IMMEDIATE): processos
+        # iniciados ao mesmo tempo aplicam cada migração uma única vez
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+        with conexao() as conn:
+            verificar_planos(conn)
+        _schema_pronto = True
+
+
+if __name__ == '__main__':
+    with transacao() as conn:
+        for versao, descricao in aplicar_migracoes(conn):
+            print(f'{versao}: {descricao}')
+        print(f'Schema na versão {versao_schema(conn)}.')
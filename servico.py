@@ -0,0 +1,327 @@
+import json
+import sqlite3
+
+from auth import (gerar_hash, verificar_senha, precisa_rehash, criar_token, ler_token, token_confere, segredo_sessao,
+                  validar_username)
+from database import (conexao, recalcular_saldos, transportar_saldos, marcar_alteracao,
+                      inserir_lancamento, alterar_lancamento, remover_lancamento,
+                      SQL_INSERIR_LANCAMENTO, SQL_ALTERAR_LANCAMENTO, SQL_LIMPAR_MES,
+                      SQL_RESUMO_MENSAL, SQL_RESUMO_CONTAS, COLUNAS_LISTAGEM,
+                      periodo_da_data, nome_mes, filtros_lancamentos, buscar_pagina, totais_filtrados, buscar_texto,
+                      diario_alteracoes, livro_em, registrar_foto, reconstruir_resumo_periodos,
+                      criar_tabela_versoes)
+from escrita import executar
+from exportacao import zip_ano, csv_periodo
+
+# Operações do livro sem interface: usadas pela aplicação Streamlit, pela API HTTP e por scripts.
+# Erros de validação sobem como ValueError; quem chama decide como exibi-los.
+# As escritas passam pelo escritor único (escrita.executar), que as agrupa em commits; quem
+# atende uma sessão chama escrita.definir_usuario para que o diário de auditoria registre o autor.
+
+PERMISSOES = {
+    'admin': 'Administrador',
+    'editor': 'Editor',
+    'visualizador': 'Apenas Visualização'
+}
+
+
+def _executar_sql(conn, sql, parametros):
+    conn.execute(sql, parametros)
+
+
+# Usuários e sessões
+def autenticar(username, senha):
+    """Confere usuário e senha; retorna (permissao, password_hash) ou None.
+    Hashes legados (SHA-256) ou com custo antigo são refeitos no login bem-sucedido."""
+    with conexao() as conn:
+        usuario = conn.execute('SELECT password_hash, permissao FROM usuarios WHERE username = ?',
+                               (username,)).fetchone()
+    if not usuario or not verificar_senha(senha, usuario[0]):
+        return None
+    password_hash, permissao = usuario
+    if precisa_rehash(password_hash):
+        password_hash = gerar_hash(senha)
+        executar(_gravar_senha, username, password_hash)
+    return permissao, password_hash
+
+
+def emitir_token(username, password_hash):
+    """Emite o token de sessão assinado de um usuário"""
+    with conexao() as conn:
+        return criar_token(segredo_sessao(conn), username, password_hash)
+
+
+def usuario_da_sessao(token):
+    """Retorna (username, permissao) de um token válido, ou None se ele expirou, foi adulterado
+    ou foi emitido antes de uma troca de senha"""
+    with conexao() as conn:
+        segredo = segredo_sessao(conn)
+        dados = ler_token(segredo, token)
+        if not dados:
+            return None
+        usuario = conn.execute('SELECT password_hash, permissao FROM usuarios WHERE username = ?',
+                               (dados[0],)).fetchone()
+    if not usuario or not token_confere(segredo, dados[1], usuario[0]):
+        return None
+    return dados[0], usuario[1]
+
+
+def _gravar_senha(conn, username, password_hash):
+    conn.execute('UPDATE usuarios SET password_hash = ? WHERE username = ?', (password_hash, username))
+
+
+def alterar_senha(username, nova_senha):
+    """Altera a senha (invalidando os tokens anteriores) e retorna o novo hash"""
+    password_hash = gerar_hash(nova_senha)
+    executar(_gravar_senha, username, password_hash)
+    return password_hash
+
+
+def _inserir_usuario(conn, username, password_hash, permissao):
+    try:
+        conn.execute('INSERT INTO usuarios (username, password_hash, permissao) VALUES (?, ?, ?)',
+                     (username, password_hash, permissao))
+    except sqlite3.IntegrityError:
+        return False
+    return True
+
+
+def criar_usuario(username, senha, permissao='visualizador'):
+    """Cria um usuário; retorna False se ele já existe"""
+    validar_username(username)
+    if permissao not in PERMISSOES:
+        raise ValueError(f"permissão inválida: '{permissao}'")
+    return executar(_inserir_usuario, username, gerar_hash(senha), permissao)
+
+
+def listar_usuarios():
+    """Retorna (username, permissao, created_at) de todos os usuários"""
+    with conexao() as conn:
+        return conn.execute('SELECT username, permissao, created_at FROM usuarios ORDER BY created_at').fetchall()
+
+
+def alterar_permissao(username, permissao):
+    """Altera a permissão de um usuário"""
+    if permissao not in PERMISSOES:
+        raise ValueError(f"permissão inválida: '{permissao}'")
+    executar(_executar_sql, 'UPDATE usuarios SET permissao = ? WHERE username = ?', (permissao, username))
+
+
+def excluir_usuario(username):
+    """Exclui um usuário"""
+    executar(_executar_sql, 'DELETE FROM usuarios WHERE username = ?', (username,))
+
+
+# Contas
+def listar_contas():
+    """Retorna as contas (nome -> id, em ordem alfabética)"""
+    with conexao() as conn:
+        return {nome: conta_id for nome, conta_id in conn.execute('SELECT nome, id FROM contas ORDER BY nome')}
+
+
+def adicionar_conta(nome):
+    """Adiciona uma conta (nomes repetidos são ignorados) e retorna o id"""
+    nome = str(nome or '').strip()
+    if not nome:
+        raise ValueError("nome da conta vazio")
+    return executar(_inserir_conta, nome)
+
+
+def _inserir_conta(conn, nome):
+    conn.execute('INSERT OR IGNORE INTO contas (nome) VALUES (?)', (nome,))
+    marcar_alteracao(conn, 'contas')
+    return conn.execute('SELECT id FROM contas WHERE nome = ?', (nome,)).fetchone()[0]
+
+
+# Lançamentos (valores em centavos)
+def _validar(data, historico, entrada, saida):
+    if not data or not str(historico).strip():
+        raise ValueError("data e histórico são obrigatórios")
+    if entrada < 0 or saida < 0:
+        raise ValueError("entrada e saída não podem ser negativas")
+
+
+def novo_lancamento(data, historico, complemento, entrada, saida, conta_id=None):
+    """Insere um lançamento e retorna o id"""
+    _validar(data, historico, entrada, saida)
+    return executar(inserir_lancamento, data, historico, complemento, entrada, saida, conta_id)
+
+
+def editar_lancamento(lancamento_id, data, historico, complemento, entrada, saida, conta_id=None):
+    """Altera um lançamento; retorna False se ele não existe"""
+    _validar(data, historico, entrada, saida)
+    return executar(alterar_lancamento, lancamento_id, data, historico, complemento, entrada, saida, conta_id)
+
+
+def excluir_lancamento(lancamento_id):
+    """Exclui um lançamento; retorna False se ele não existe"""
+    return executar(remover_lancamento, lancamento_id)
+
+
+def aplicar_lote(alterados, excluidos):
+    """Altera e exclui vários lançamentos em uma única transação, recalculando cada período uma vez.
+    `alterados` traz tuplas (id, data, historico, complemento, entrada, saida, conta_id)."""
+    if not alterados and not excluidos:
+        return
+    for _, data, historico, _, entrada, saida, _ in alterados:
+        _validar(data, historico, entrada, saida)
+    executar(_aplicar_lote, alterados, excluidos)
+
+
+def _aplicar_lote(conn, alterados, excluidos):
+    ids = [lancamento[0] for lancamento in alterados] + list(excluidos)
+    anteriores = conn.execute(
+        f"SELECT data, periodo FROM lancamentos WHERE id IN ({', '.join('?' * len(ids))})", ids
+    ).fetchall()
+    if len(anteriores) != len(set(ids)):
+        raise ValueError("lançamento não encontrado (alterado por outro usuário?)")
+
+    # Data mais antiga afetada em cada período (antes ou depois da edição)
+    inicio_periodos = {}
+    for data, periodo in anteriores:
+        inicio_periodos[periodo] = min(str(data), inicio_periodos.get(periodo, str(data)))
+
+    linhas = []
+    for lancamento_id, data, historico, complemento, entrada, saida, conta_id in alterados:
+        periodo = periodo_da_data(data)
+        inicio_periodos[periodo] = min(str(data), inicio_periodos.get(periodo, str(data)))
+        linhas.append((nome_mes(periodo), periodo, str(data), historico, complemento,
+                       entrada, saida, conta_id, lancamento_id))
+
+    conn.executemany(SQL_ALTERAR_LANCAMENTO, linhas)
+    conn.executemany('DELETE FROM lancamentos WHERE id = ?', [(lancamento_id,) for lancamento_id in excluidos])
+
+    # Saldos recalculados uma única vez por período afetado
+    for periodo, data_inicio in inicio_periodos.items():
+        recalcular_saldos(conn, periodo, (data_inicio, 0), transportar=False)
+    if inicio_periodos:
+        transportar_saldos(conn, min(inicio_periodos))
+        marcar_alteracao(conn, 'lancamentos')
+
+
+def importar_lancamentos(registros):
+    """Insere em uma única transação os registros (data, historico, complemento, entrada, saida, conta),
+    com a conta pelo nome ('' sem conta); qualquer erro desfaz tudo. Retorna a quantidade inserida."""
+    # Leitura e validação do arquivo ficam fora do escritor: a transação do grupo só recebe as linhas prontas
+    contas = listar_contas()
+    linhas = []
+    for data, historico, complemento, entrada, saida, conta in registros:
+        _validar(data, historico, entrada, saida)
+        if conta and conta not in contas:
+            raise ValueError(f"conta '{conta}' não cadastrada")
+        data = str(data)
+        periodo = periodo_da_data(data)
+        linhas.append((nome_mes(periodo), periodo, data, historico, complemento, entrada, saida,
+                       contas.get(conta)))
+    if not linhas:
+        return 0
+    return executar(_importar_lancamentos, linhas)
+
+
+def _importar_lancamentos(conn, linhas):
+    conn.executemany(SQL_INSERIR_LANCAMENTO, linhas)
+
+    # Saldos recalculados uma única vez por período afetado, a partir da data mais antiga importada
+    inicio_periodos = {}
+    for _, periodo, data, *_ in linhas:
+        inicio_periodos[periodo] = min(data, inicio_periodos.get(periodo, data))
+    for periodo, data_inicio in inicio_periodos.items():
+        recalcular_saldos(conn, periodo, (data_inicio, 0), transportar=False)
+    transportar_saldos(conn, min(inicio_periodos))
+    marcar_alteracao(conn, 'lancamentos')
+    return len(linhas)
+
+
+def limpar_periodo(periodo):
+    """Remove todos os lançamentos de um período"""
+    executar(_limpar_periodo, periodo)
+
+
+def _limpar_periodo(conn, periodo):
+    conn.execute(SQL_LIMPAR_MES, (periodo,))
+    # Os meses seguintes deixam de receber o saldo deste mês
+    transportar_saldos(conn, periodo)
+    marcar_alteracao(conn, 'lancamentos')
+
+
+# Leituras (linhas como dicionários, prontas para JSON)
+def _dicionarios(cursor):
+    colunas = [descricao[0] for descricao in cursor.description]
+    return [dict(zip(colunas, linha)) for linha in cursor.fetchall()]
+
+
+def pagina_lancamentos(periodo, filtros=None, apos=None, tamanho=50):
+    """Retorna (lançamentos, há próxima página, (quantidade, entradas, saídas) dos filtros)"""
+    condicao = filtros_lancamentos(periodo, **(filtros or {}))
+    with conexao() as conn:
+        linhas = buscar_pagina(conn, condicao, apos, tamanho)
+        totais = totais_filtrados(conn, condicao)
+    return [dict(zip(COLUNAS_LISTAGEM, linha)) for linha in linhas[:tamanho]], len(linhas) > tamanho, totais
+
+
+def pesquisar(texto, data_inicio=None, data_fim=None, limite=200):
+    """Busca textual em todos os períodos, por relevância"""
+    with conexao() as conn:
+        return [dict(zip(COLUNAS_LISTAGEM, linha)) for linha in buscar_texto(conn, texto, data_inicio, data_fim, limite)]
+
+
+def resumo_mensal(ano):
+    """Entradas, saídas, saldos e quantidade de lançamentos de cada mês do ano"""
+    with conexao() as conn:
+        return _dicionarios(conn.execute(SQL_RESUMO_MENSAL, {'ano': int(ano)}))
+
+
+def resumo_contas(ano):
+    """Entradas, saídas e quantidade de lançamentos por mês e conta do ano"""
+    with conexao() as conn:
+        return _dicionarios(conn.execute(SQL_RESUMO_CONTAS, {'ano': int(ano)}))
+
+
+# Auditoria
+def diario(lancamento_id=None, limite=200):
+    """Alterações mais recentes do diário, com os campos antes/depois já decodificados"""
+    with conexao() as conn:
+        linhas = diario_alteracoes(conn, lancamento_id, limite)
+    colunas = ('id', 'quando', 'usuario', 'operacao', 'lancamento_id', 'antes', 'depois')
+    return [{**dict(zip(colunas, linha)),
+             'antes': json.loads(linha[5]) if linha[5] else None,
+             'depois': json.loads(linha[6]) if linha[6] else None} for linha in linhas]
+
+
+def livro_no_momento(momento, periodo=None):
+    """Lançamentos como estavam no momento 'AAAA-MM-DD HH:MM:SS' (UTC, ou ISO 8601 com fuso), de um período
+    ou de todos"""
+    with conexao() as conn:
+        return [dict(zip(COLUNAS_LISTAGEM, linha)) for linha in livro_em(conn, momento, periodo)]
+
+
+def fotografar_livro():
+    """Registra agora uma foto do livro (além das periódicas) e retorna o id dela"""
+    return executar(registrar_foto)
+
+
+# Manutenção
+def reconstruir_resumo():
+    """Reconstrói o resumo por período a partir dos lançamentos"""
+    executar(_reconstruir_resumo)
+
+
+def _reconstruir_resumo(conn):
+    reconstruir_resumo_periodos(conn)
+    # Bancos anteriores aos contadores de versão (manutenção pela linha de comando)
+    criar_tabela_versoes(conn)
+    marcar_alteracao(conn, 'lancamentos')
+
+
+# Exportação
+def exportar_periodo(periodo):
+    """CSV dos lançamentos de um período (bytes)"""
+    with conexao() as conn:
+        return csv_periodo(conn, periodo)
+
+
+def exportar_ano(ano, progresso=None):
+    """ZIP do ano (arquivo temporário posicionado no início)"""
+    with conexao() as conn:
+        contas = [nome for (nome,) in conn.execute('SELECT nome FROM contas ORDER BY nome')]
+        return zip_ano(conn, ano, contas, progresso)
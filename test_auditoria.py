@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+import database
+import escrita
+import servico
+from database import conexao, transacao, fechar_conexoes, livro_em
+from migracoes import aplicar_migracoes
+
+
+class TestAutorDoDiario(unittest.TestCase):
+    """Autor das alterações no diário de auditoria"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.db_path_original = database.DB_PATH
+        fechar_conexoes()
+        database.DB_PATH = os.path.join(self.diretorio.name, 'livro_caixa.db')
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+
+    def tearDown(self):
+        escrita.definir_usuario(None)
+        fechar_conexoes()
+        database.DB_PATH = self.db_path_original
+        self.diretorio.cleanup()
+
+    def diario(self):
+        with conexao() as conn:
+            return conn.execute('SELECT usuario, operacao FROM auditoria ORDER BY id').fetchall()
+
+    def test_autor_das_escritas_do_escritor(self):
+        escrita.definir_usuario('ana')
+        lancamento_id = servico.novo_lancamento('2024-01-05', 'Venda', '', 1000, 0)
+
+        # Outra sessão (outra thread) grava no mesmo período com o seu usuário
+        def outra_sessao():
+            escrita.definir_usuario('bia')
+            servico.editar_lancamento(lancamento_id, '2024-01-05', 'Venda à vista', '', 1000, 0)
+        sessao = threading.Thread(target=outra_sessao)
+        sessao.start()
+        sessao.join()
+
+        self.assertEqual(self.diario(), [('ana', 'inclusao'), ('bia', 'alteracao')])
+        with conexao() as conn:
+            # O autor só existe dentro da transação do grupo
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM auditoria_autor').fetchone()[0], 0)
+
+    def test_banco_gravavel_sem_a_aplicacao(self):
+        # Conexão comum do sqlite3 (como a do CLI ou de um script de reparo), sem funções registradas
+        conn = sqlite3.connect(database.DB_PATH)
+        try:
+            conn.execute("""
+                INSERT INTO lancamentos (mes, periodo, data, historico, complemento, entrada, saida, saldo)
+                VALUES ('Janeiro', 202401, '2024-01-10', 'Ajuste manual', '', 500, 0, 500)
+            """)
+            conn.execute("UPDATE lancamentos SET historico = 'Ajuste' WHERE historico = 'Ajuste manual'")
+            conn.execute('DELETE FROM lancamentos')
+            conn.commit()
+        finally:
+            conn.close()
+        self.assertEqual(self.diario(), [(None, 'inclusao'), (None, 'alteracao'), (None, 'exclusao')])
+
+
+class TestLivroNoMomento(unittest.TestCase):
+    """Reconstrução do livro em um momento do diário (UTC)"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.db_path_original = database.DB_PATH
+        fechar_conexoes()
+        database.DB_PATH = os.path.join(self.diretorio.name, 'livro_caixa.db')
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+            database.inserir_lancamento(conn, '2024-01-05', 'Venda', '', 1000, 0)
+        with conexao() as conn:
+            self.inicio = datetime.fromisoformat(conn.execute('SELECT MIN(quando) FROM auditoria_fotos').fetchone()[0])
+            self.inclusao = datetime.fromisoformat(conn.execute('SELECT MAX(quando) FROM auditoria').fetchone()[0])
+
+    def tearDown(self):
+        fechar_conexoes()
+        database.DB_PATH = self.db_path_original
+        self.diretorio.cleanup()
+
+    def livro(self, momento):
+        with conexao() as conn:
+            return livro_em(conn, momento, 202401)
+
+    def test_momento_sem_fuso_em_utc(self):
+        depois = self.inclusao + timedelta(seconds=1)
+        self.assertEqual([linha[2] for linha in self.livro(depois.isoformat(' '))], ['Venda'])
+
+    def test_momento_com_fuso_convertido_para_utc(self):
+        depois = self.inclusao + timedelta(seconds=1)
+        esperado = self.livro(depois.isoformat(' '))
+        # O mesmo instante em Brasília (-03:00) e em UTC com sufixo Z
+        self.assertEqual(self.livro((depois - timedelta(hours=3)).isoformat() + '-03:00'), esperado)
+        self.assertEqual(self.livro(depois.isoformat() + 'Z'), esperado)
+
+    def test_momento_com_fuso_antes_do_diario(self):
+        # Uma hora antes do início do diário, escrita em +03:00 (lida como UTC, cairia 2 h depois do início)
+        antes = self.inicio - timedelta(hours=1) + timedelta(hours=3)
+        with self.assertRaises(ValueError):
+            self.livro(antes.isoformat() + '+03:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
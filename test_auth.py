@@ -0,0 +1,25 @@
+import unittest
+
+import servico
+from auth import validar_username
+
+
+class TestNomeDeUsuario(unittest.TestCase):
+    """Nomes de usuário aparecem nas páginas: marcação HTML é recusada no cadastro"""
+
+    def test_nomes_aceitos(self):
+        for username in ('ana', 'joão.silva', 'tesouraria-929', 'Maria Souza'):
+            validar_username(username)
+
+    def test_nomes_recusados(self):
+        for username in ('', '   ', '<script>', 'ana&bia', 'o"neil', "d'avila", 'a>b'):
+            with self.assertRaises(ValueError):
+                validar_username(username)
+
+    def test_cadastro_recusa_antes_de_gravar(self):
+        with self.assertRaisesRegex(ValueError, '<'):
+            servico.criar_usuario('<img src=x onerror=alert(1)>', 'senha123')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+import database
+import desempenho
+import servico
+from database import conexao, transacao, fechar_conexoes
+from migracoes import aplicar_migracoes
+
+
+class TestConsultasDoRerun(unittest.TestCase):
+    """Quantidade de consultas SQL somada ao rerun em andamento"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.db_path_original = database.DB_PATH
+        fechar_conexoes()
+        database.DB_PATH = os.path.join(self.diretorio.name, 'livro_caixa.db')
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+        desempenho.iniciar_execucao()
+
+    def tearDown(self):
+        desempenho._local.execucao = None
+        fechar_conexoes()
+        database.DB_PATH = self.db_path_original
+        self.diretorio.cleanup()
+
+    def consultas(self):
+        return desempenho._execucao()['consultas']
+
+    def test_execute_da_conexao(self):
+        with conexao() as conn:
+            conn.execute('SELECT 1').fetchone()
+            conn.execute('SELECT count(*) FROM lancamentos').fetchone()
+            conn.execute('SELECT id FROM contas').fetchall()
+        self.assertEqual(self.consultas(), 3)
+        self.assertGreater(desempenho._execucao()['tempo_consultas'], 0)
+
+    def test_executemany_e_executescript(self):
+        with conexao() as conn:
+            conn.executescript('CREATE TEMP TABLE t (x); DROP TABLE t; CREATE TEMP TABLE t (x);')
+            conn.executemany('INSERT INTO t VALUES (?)', [(1,), (2,)])
+        self.assertEqual(self.consultas(), 2)
+
+    def test_cursor_explicito(self):
+        with conexao() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+        # O fetchall soma tempo, mas não conta uma nova consulta
+        self.assertEqual(self.consultas(), 1)
+
+    def test_escritas_feitas_pelo_escritor(self):
+        # A gravação roda na thread do escritor; as consultas dela voltam para o rerun que a pediu
+        servico.novo_lancamento('2024-01-05', 'Venda', '', 1000, 0)
+        consultas_insercao = self.consultas()
+        # INSERT, recálculo do saldo e transporte, no mínimo
+        self.assertGreaterEqual(consultas_insercao, 3)
+        self.assertGreater(desempenho._execucao()['tempo_consultas'], 0)
+
+        servico.excluir_lancamento(10 ** 6)  # inexistente: a operação também conta
+        self.assertGreater(self.consultas(), consultas_insercao)
+
+    def test_fora_de_um_rerun(self):
+        desempenho._local.execucao = None
+        with conexao() as conn:
+            conn.execute('SELECT 1').fetchone()
+        self.assertIsNone(desempenho._execucao())
+
+
+if __name__ == '__main__':
+    unittest.main()
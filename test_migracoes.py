@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+
+import database
+from database import conexao, transacao, fechar_conexoes, migrar_centavos, SQL_SALDO_EXIBIDO
+from migracoes import MIGRACOES, aplicar_migracoes, versao_schema
+
+# Livro anterior à migração 8: valores em reais (REAL), com as dízimas binárias de sempre
+LANCAMENTOS_REAIS = [
+    # (data, entrada, saida)
+    ('2024-01-05', 0.1, 0),
+    ('2024-01-10', 0.2, 0),
+    ('2024-01-20', 0, 0.29),
+    ('2024-02-01', 1234.56, 0),
+    ('2024-02-15', 0, 1.005),
+    ('2024-03-03', 19.99, 0),
+]
+
+# (entrada, saida, saldo exibido) em centavos, na ordem (data, id)
+ESPERADO = [
+    (10, 0, 10),
+    (20, 0, 30),
+    (0, 29, 1),
+    (123456, 0, 123457),
+    (0, 101, 123356),
+    (1999, 0, 125355),
+]
+
+# período -> (entradas, saídas, saldo inicial, saldo final, lançamentos)
+RESUMO_ESPERADO = {
+    202401: (30, 29, 0, 1, 3),
+    202402: (123456, 101, 1, 123356, 2),
+    202403: (1999, 0, 123356, 125355, 1),
+}
+
+
+class TestMigracaoCentavos(unittest.TestCase):
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.db_path_original = database.DB_PATH
+        fechar_conexoes()
+        database.DB_PATH = os.path.join(self.diretorio.name, 'livro_caixa.db')
+
+        # Banco no schema 7 (valores REAL), com um lançamento excluído depois do último id
+        with transacao() as conn:
+            versao_schema(conn)
+            for versao, descricao, migracao in MIGRACOES:
+                if versao > 7:
+                    break
+                migracao(conn)
+                conn.execute('INSERT INTO schema_version (versao, descricao) VALUES (?, ?)', (versao, descricao))
+            for data, entrada, saida in LANCAMENTOS_REAIS + [('2024-03-31', 5.0, 0)]:
+                periodo = database.periodo_da_data(data)
+                conn.execute('''
+                    INSERT INTO lancamentos (mes, periodo, data, historico, complemento, entrada, saida, saldo)
+                    VALUES (?, ?, ?, 'Histórico', '', ?, ?, 0.30000000000000004)
+                ''', (database.nome_mes(periodo), periodo, data, entrada, saida))
+            conn.execute('DELETE FROM lancamentos WHERE data = ?', ('2024-03-31',))
+
+    def tearDown(self):
+        fechar_conexoes()
+        database.DB_PATH = self.db_path_original
+        self.diretorio.cleanup()
+
+    def lancamentos(self, conn):
+        return conn.execute(f'''
+            SELECT entrada, saida, {SQL_SALDO_EXIBIDO} FROM lancamentos ORDER BY data, id
+        ''').fetchall()
+
+    def test_valores_convertidos_para_centavos(self):
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+        with conexao() as conn:
+            self.assertEqual(self.lancamentos(conn), ESPERADO)
+            tipos = conn.execute(
+                "SELECT DISTINCT typeof(entrada), typeof(saida), typeof(saldo) FROM lancamentos").fetchall()
+            self.assertEqual(tipos, [('integer', 'integer', 'integer')])
+
+    def test_resumo_por_periodo_em_centavos(self):
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+        with conexao() as conn:
+            resumo = {periodo: tuple(valores) for periodo, *valores in conn.execute('''
+                SELECT periodo, entradas, saidas, saldo_inicial, saldo_final, lancamentos FROM period_summary
+            ''')}
+            self.assertEqual(resumo, RESUMO_ESPERADO)
+            self.assertEqual(database.verificar_resumo_periodos(conn), [])
+
+    def test_ids_e_sequencia_preservados(self):
+        with conexao() as conn:
+            ids = [linha[0] for linha in conn.execute('SELECT id FROM lancamentos ORDER BY id')]
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+            self.assertEqual([linha[0] for linha in conn.execute('SELECT id FROM lancamentos ORDER BY id')], ids)
+            # O id do lançamento excluído antes da migração não é reutilizado
+            novo = database.inserir_lancamento(conn, '2024-03-10', 'Novo', '', 100, 0)
+        self.assertEqual(novo, len(LANCAMENTOS_REAIS) + 2)
+
+    def test_migracao_executada_uma_unica_vez(self):
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+        with transacao() as conn:
+            self.assertEqual(aplicar_migracoes(conn), [])
+            # Chamada direta sobre colunas já INTEGER não multiplica os valores de novo
+            migrar_centavos(conn)
+        with conexao() as conn:
+            self.assertEqual(self.lancamentos(conn), ESPERADO)
+            self.assertEqual(versao_schema(conn), MIGRACOES[-1][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
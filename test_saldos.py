@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+
+import database
+from database import (conexao, transacao, fechar_conexoes, inserir_lancamento, alterar_lancamento,
+                      remover_lancamento, recalcular_saldos, transportar_saldos, recalculo_agrupado,
+                      SQL_SALDO_EXIBIDO)
+from migracoes import aplicar_migracoes
+
+
+class TestSaldos(unittest.TestCase):
+    """Saldo acumulado (UPDATE com função de janela) e transporte do saldo entre períodos"""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.db_path_original = database.DB_PATH
+        fechar_conexoes()
+        database.DB_PATH = os.path.join(self.diretorio.name, 'livro_caixa.db')
+        with transacao() as conn:
+            aplicar_migracoes(conn)
+
+        # Inseridos fora da ordem das datas: o saldo segue (data, id), não a ordem de inserção
+        self.ids = {}
+        with transacao() as conn:
+            for nome, data, entrada, saida in [
+                ('fev', '2024-02-10', 0, 3000),
+                ('jan2', '2024-01-20', 0, 2500),
+                ('jan1', '2024-01-05', 10000, 0),
+                ('mar', '2024-03-01', 500, 0),
+                ('jan3', '2024-01-20', 1000, 0),
+            ]:
+                self.ids[nome] = inserir_lancamento(conn, data, nome, '', entrada, saida)
+
+    def tearDown(self):
+        fechar_conexoes()
+        database.DB_PATH = self.db_path_original
+        self.diretorio.cleanup()
+
+    def saldos(self):
+        """(historico, saldo exibido) na ordem do livro"""
+        with conexao() as conn:
+            return conn.execute(f'''
+                SELECT historico, {SQL_SALDO_EXIBIDO} FROM lancamentos ORDER BY data, id
+            ''').fetchall()
+
+    def resumo(self):
+        """período -> (saldo inicial, saldo final)"""
+        with conexao() as conn:
+            return {periodo: (inicial, final) for periodo, inicial, final in conn.execute(
+                'SELECT periodo, saldo_inicial, saldo_final FROM period_summary ORDER BY periodo')}
+
+    def test_saldo_acumulado_na_ordem_das_datas(self):
+        self.assertEqual(self.saldos(), [
+            ('jan1', 10000), ('jan2', 7500), ('jan3', 8500), ('fev', 5500), ('mar', 6000),
+        ])
+
+    def test_saldo_final_transportado_para_o_periodo_seguinte(self):
+        self.assertEqual(self.resumo(), {
+            202401: (0, 8500),
+            202402: (8500, 5500),
+            202403: (5500, 6000),
+        })
+        # Dentro do período, lancamentos.saldo acumula só a partir do saldo inicial
+        with conexao() as conn:
+            self.assertEqual(conn.execute("SELECT saldo FROM lancamentos WHERE historico = 'fev'").fetchone(),
+                             (-3000,))
+
+    def test_alteracao_em_periodo_antigo_atualiza_os_seguintes(self):
+        with transacao() as conn:
+            alterar_lancamento(conn, self.ids['jan1'], '2024-01-05', 'jan1', '', 20000, 0)
+        self.assertEqual(self.saldos(), [
+            ('jan1', 20000), ('jan2', 17500), ('jan3', 18500), ('fev', 15500), ('mar', 16000),
+        ])
+        self.assertEqual(self.resumo()[202403], (15500, 16000))
+
+    def test_mudanca_de_periodo_e_exclusao(self):
+        with transacao() as conn:
+            # jan2 passa para março, antes do lançamento de março (mesma data, id menor)
+            alterar_lancamento(conn, self.ids['jan2'], '2024-03-01', 'jan2', '', 0, 2500)
+            remover_lancamento(conn, self.ids['fev'])
+        self.assertEqual(self.saldos(), [
+            ('jan1', 10000), ('jan3', 11000), ('jan2', 8500), ('mar', 9000),
+        ])
+        # Fevereiro ficou sem lançamentos e sai do resumo; março parte do saldo de janeiro
+        self.assertEqual(self.resumo(), {
+            202401: (0, 11000),
+            202403: (11000, 9000),
+        })
+        with conexao() as conn:
+            self.assertEqual(database.verificar_resumo_periodos(conn), [])
+
+    def test_recalculo_agrupado_igual_ao_imediato(self):
+        esperado = self.saldos()
+        with transacao() as conn:
+            conn.execute('UPDATE lancamentos SET saldo = 0')
+            with recalculo_agrupado(conn):
+                for periodo in (202403, 202401, 202402):
+                    recalcular_saldos(conn, periodo)
+        self.assertEqual(self.saldos(), esperado)
+
+    def test_recalculo_a_partir_de_uma_posicao(self):
+        # Só as linhas a partir de (data, id) são reescritas; as anteriores servem de base
+        with transacao() as conn:
+            conn.execute("UPDATE lancamentos SET saldo = 0 WHERE historico IN ('jan2', 'jan3')")
+            recalcular_saldos(conn, 202401, ('2024-01-20', 0), transportar=False)
+            transportar_saldos(conn, 202401)
+        self.assertEqual(self.saldos()[:3], [('jan1', 10000), ('jan2', 7500), ('jan3', 8500)])
+
+
+if __name__ == '__main__':
+    unittest.main()